@@ -2,29 +2,32 @@
 
 from __future__ import annotations
 
+import dataclasses
+
 import streamlit as st
 
 from langgraph_rag.config import IngestionConfig, TableConfig
-from langgraph_rag.graph.multi_agent_rwe_graph import build_rwe_multi_agent_graph
-from langgraph_rag.observability.mlflow_utils import (
-    init_mlflow,
-    start_query_run,
-    finish_query_run,
-    log_feedback,
-)
+
+# The graph (LangGraph, OpenAI, pandas, ...) and MLflow helpers are imported
+# where they are used, so module start-up only pays for streamlit + config.
 
 # ---------- 1. Initialize MLflow once ----------
 
-# If you have a custom tracking URI, pass it here; otherwise it uses the default ./mlruns
-init_mlflow(experiment_name="langgraph_rag_e2e")
+@st.cache_resource
+def init_mlflow_once() -> None:
+    from langgraph_rag.observability.mlflow_utils import init_mlflow
+
+    # If you have a custom tracking URI, pass it here; otherwise it uses the default ./mlruns
+    init_mlflow(experiment_name="langgraph_rag_e2e")
+
+
+init_mlflow_once()
 
 
 # ---------- 2. Build / cache the graph & config ----------
 
-@st.cache_resource
-def get_graph_and_config():
-    
-    config = IngestionConfig(
+def get_ingestion_config() -> IngestionConfig:
+    return IngestionConfig(
         tables=[
             TableConfig(
                 name="patients",
@@ -34,8 +37,21 @@ def get_graph_and_config():
         ],
         metadata_text_path="data/clinical_patient_meta.txt",
     )
-    graph = build_rwe_multi_agent_graph(config, use_smart_analyst=True)
-    return graph, config
+
+
+# Key the cache on the config's field values so the graph is only rebuilt
+# when the config actually changes.
+@st.cache_resource(hash_funcs={IngestionConfig: dataclasses.astuple})
+def get_graph(config: IngestionConfig):
+    from langgraph_rag.graph.multi_agent_rwe_graph import build_rwe_multi_agent_graph
+
+    # The writer runs outside the graph so its answer can be streamed.
+    return build_rwe_multi_agent_graph(config, use_smart_analyst=True, include_writer=False)
+
+
+def get_graph_and_config():
+    config = get_ingestion_config()
+    return get_graph(config), config
 
 
 graph, _ = get_graph_and_config()
@@ -54,58 +70,96 @@ st.title("RWE Multi-Agent RAG (MSK CHORD Cohort)")
 query = st.text_input("Ask a question about the cohort")
 
 if st.button("Run analysis") and query:
+    from langgraph_rag.llm import stream_writer_answer
+    from langgraph_rag.observability.mlflow_utils import start_query_run, finish_query_run
+
     # 4a. Start MLflow run
     run_id, start_time = start_query_run(query)
     st.session_state["last_run_id"] = run_id
 
-    # 4b. Run the multi-agent graph
+    # 4b. Run the multi-agent graph (oncologist -> planner -> analyst)
     with st.spinner("Thinking..."):
         result = graph.invoke({"user_query": query})
 
-    answer = result.get("final_answer", "(No answer generated)")
-
-    # 4c. Finish MLflow run (log latency + artifacts)
-    finish_query_run(start_time, result)
-
-    # 4d. Show answer
+    # 4c. Stream the writer's answer as it is generated
     st.markdown("### Answer")
-    st.write(answer)
+    answer = st.write_stream(
+        stream_writer_answer(
+            user_query=query,
+            oncologist_view=result.get("oncologist_view", {}),
+            plan=result.get("plan", {}),
+            execution_result=result.get("execution_result", {}),
+            artifacts=result.get("artifacts"),
+        )
+    )
+    if not answer:
+        answer = "(No answer generated)"
+        st.write(answer)
+    result["final_answer"] = answer
+
+    # 4d. Finish MLflow run (log latency + artifacts)
+    finish_query_run(start_time, result, run_id=run_id)
 
 
 # ---------- 5. Feedback section (wired to MLflow) ----------
 
+# Feedback is logged from on_click callbacks, which run before the rerun the
+# click triggers; the resulting message is shown on that rerun.
+
+def _log_useful(run_id: str) -> None:
+    from langgraph_rag.observability.mlflow_utils import log_feedback
+
+    log_feedback(run_id=run_id, useful=True)
+    st.session_state["feedback_notice"] = ("success", "Thanks! Feedback recorded as useful ✅")
+
+
+def _log_not_useful(run_id: str) -> None:
+    from langgraph_rag.observability.mlflow_utils import log_feedback
+
+    log_feedback(run_id=run_id, useful=False)
+    st.session_state["feedback_notice"] = ("info", "Thanks! Feedback recorded as not useful 👎")
+
+
+def _log_feedback_details(run_id: str) -> None:
+    from langgraph_rag.observability.mlflow_utils import log_feedback
+
+    feedback_text = st.session_state.get("feedback_text", "").strip()
+    if not feedback_text:
+        st.session_state["feedback_notice"] = ("warning", "Please enter some text before submitting.")
+        return
+
+    log_feedback(
+        run_id=run_id,
+        useful=True,  # or leave as last clicked; you can decide policy
+        comment=feedback_text,
+    )
+    st.session_state["feedback_notice"] = ("success", "Thanks for the detailed feedback 🙌")
+
+
 if st.session_state.get("last_run_id"):
+    last_run_id = st.session_state["last_run_id"]
+
     st.markdown("---")
     st.markdown("### Was this answer useful?")
 
     col1, col2 = st.columns(2)
 
     with col1:
-        if st.button("👍 Yes, useful"):
-            log_feedback(
-                run_id=st.session_state["last_run_id"],
-                useful=True,
-            )
-            st.success("Thanks! Feedback recorded as useful ✅")
+        st.button("👍 Yes, useful", on_click=_log_useful, args=(last_run_id,))
 
     with col2:
-        if st.button("👎 No, not useful"):
-            log_feedback(
-                run_id=st.session_state["last_run_id"],
-                useful=False,
-            )
-            st.info("Thanks! Feedback recorded as not useful 👎")
+        st.button("👎 No, not useful", on_click=_log_not_useful, args=(last_run_id,))
 
     # Optional: free-text feedback
     with st.expander("Optional: tell us why"):
-        feedback_text = st.text_area("What made this answer useful or not?")
-        if st.button("Submit feedback details"):
-            if feedback_text.strip():
-                log_feedback(
-                    run_id=st.session_state["last_run_id"],
-                    useful=True,  # or leave as last clicked; you can decide policy
-                    comment=feedback_text.strip(),
-                )
-                st.success("Thanks for the detailed feedback 🙌")
-            else:
-                st.warning("Please enter some text before submitting.")
+        st.text_area("What made this answer useful or not?", key="feedback_text")
+        st.button(
+            "Submit feedback details",
+            on_click=_log_feedback_details,
+            args=(last_run_id,),
+        )
+
+    notice = st.session_state.pop("feedback_notice", None)
+    if notice:
+        kind, message = notice
+        getattr(st, kind)(message)
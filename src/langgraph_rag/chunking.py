@@ -2,54 +2,100 @@
 
 from __future__ import annotations
 
+import logging
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack
 from dataclasses import dataclass
+from functools import lru_cache
+from itertools import repeat
+from multiprocessing.context import BaseContext
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterator, List, Tuple
 
+import numpy as np
 import pandas as pd
 import tiktoken
 
 from .config import IngestionConfig, TableConfig
 
+logger = logging.getLogger(__name__)
 
-@dataclass
+
+@dataclass(slots=True, frozen=True)
 class DocChunk:
     id: str
     text: str
     metadata: Dict[str, Any]
+    n_tokens: int = 0
 
 
 # ---------- Tokenisation + chunking ----------
 
-def get_token_encoder(model: str = "cl100k_base"):
+TOKEN_ENCODING = "cl100k_base"
+
+
+@lru_cache(maxsize=4)
+def get_token_encoder(model: str = TOKEN_ENCODING):
     return tiktoken.get_encoding(model)
 
 
-def chunk_text(
-    text: str,
+def _token_windows(
+    tokens: List[int],
     *,
-    encoder,
     chunk_token_size: int,
     chunk_overlap: int,
-) -> List[str]:
-    tokens = encoder.encode(text)
-    chunks: List[str] = []
+) -> List[List[int]]:
+    """Split a token list into overlapping windows of at most chunk_token_size."""
+    stride = chunk_token_size - chunk_overlap
+    if stride <= 0:
+        raise ValueError(
+            f"chunk_overlap ({chunk_overlap}) must be smaller than "
+            f"chunk_token_size ({chunk_token_size})"
+        )
 
-    start = 0
     n = len(tokens)
+    if n == 0:
+        return []
 
-    while start < n:
-        end = min(start + chunk_token_size, n)
-        chunk_tokens = tokens[start:end]
-        chunk = encoder.decode(chunk_tokens)
-        chunks.append(chunk)
+    # A window starting at s is needed only while the previous one
+    # (ending at s + chunk_overlap) stops short of the end.
+    return [
+        tokens[s:s + chunk_token_size]
+        for s in range(0, max(n - chunk_overlap, 1), stride)
+    ]
 
-        if end == n:
-            break
 
-        start = end - chunk_overlap
+def chunk_tokens(
+    tokens: List[int],
+    *,
+    encoder,
+    chunk_token_size: int,
+    chunk_overlap: int,
+) -> List[str]:
+    """Chunk an already-encoded token list and decode the windows in one batch."""
+    windows = _token_windows(
+        tokens,
+        chunk_token_size=chunk_token_size,
+        chunk_overlap=chunk_overlap,
+    )
+    return encoder.decode_batch(windows)
 
-    return chunks
+
+def chunk_text(
+    text: str,
+    *,
+    encoder,
+    chunk_token_size: int,
+    chunk_overlap: int,
+) -> List[str]:
+    return chunk_tokens(
+        encoder.encode_ordinary(text),
+        encoder=encoder,
+        chunk_token_size=chunk_token_size,
+        chunk_overlap=chunk_overlap,
+    )
 
 
 # ---------- Column inference ----------
@@ -59,7 +105,15 @@ def infer_text_columns(df: pd.DataFrame, table_cfg: TableConfig) -> List[str]:
     If text_columns is explicitly set on the table → use that.
     Otherwise:
       - use all columns except the id_column
+      - minus columns that are entirely empty
+      - minus columns that hold a single value, once the table has at least
+        two rows (in a one-row table every column is single-valued, so
+        those are all kept)
       - optionally you can filter to 'object'/string columns if you want
+
+    Changing which columns are kept changes every row's text while chunk
+    ids stay the same; re-running ingestion replaces those chunks (see
+    IngestionConfig.skip_existing).
     """
     if table_cfg.text_columns:
         return table_cfg.text_columns
@@ -70,11 +124,45 @@ def infer_text_columns(df: pd.DataFrame, table_cfg: TableConfig) -> List[str]:
     # If you want only string-like columns:
     # object_cols = [c for c in non_id_cols if df[c].dtype == "object"]
     # return object_cols or non_id_cols
+
+    # Columns that are entirely empty or repeat one value across all rows add
+    # nothing to tell rows apart, so leave them out.
+    n_distinct = df[non_id_cols].nunique(dropna=True)
+    min_distinct = 2 if len(df) > 1 else 1
+    dropped = [c for c in non_id_cols if n_distinct[c] < min_distinct]
+    if dropped:
+        logger.info(
+            "Table '%s': skipping empty/constant columns %s",
+            table_cfg.name,
+            dropped,
+        )
+        non_id_cols = [c for c in non_id_cols if n_distinct[c] >= min_distinct]
+
     return non_id_cols
 
 
 # ---------- Load any table as big text docs ----------
 
+# String columns with fewer distinct values than this fraction of rows
+# (sex, stage, histology, ...) are formatted once per distinct value.
+_LOW_CARDINALITY_RATIO = 0.1
+
+
+def _labelled_column(series: pd.Series, col: str) -> List[str]:
+    """
+    Returns "col: val" for every row of one column, "" where val is missing.
+    """
+    n = len(series)
+    if n and not pd.api.types.is_numeric_dtype(series.dtype):
+        codes, uniques = pd.factorize(series)
+        if len(uniques) < _LOW_CARDINALITY_RATIO * n:
+            # Missing values get code -1, which picks the trailing "".
+            labels = np.array([f"{col}: {u}" for u in uniques] + [""], dtype=object)
+            return labels[codes].tolist()
+
+    return (f"{col}: " + series.astype(str)).where(series.notna(), "").tolist()
+
+
 def _load_table_rows_as_text(
     table_cfg: TableConfig,
 ) -> List[Dict[str, Any]]:
@@ -90,6 +178,10 @@ def _load_table_rows_as_text(
     if not path.exists():
         raise FileNotFoundError(f"TSV file not found: {path}")
 
+    # The default C parser and numpy dtypes are kept on purpose: the row text
+    # is what gets embedded, and Arrow parses floats (round-trip exact) and
+    # nullable ints ("81" instead of "81.0") differently, which would change
+    # the text of most rows in existing collections.
     df = pd.read_csv(path, sep="\t")
 
     if table_cfg.id_column not in df.columns:
@@ -100,32 +192,40 @@ def _load_table_rows_as_text(
 
     text_cols = infer_text_columns(df, table_cfg)
 
-    docs: List[Dict[str, Any]] = []
-    for idx, row in df.iterrows():
-        row_id = str(row[table_cfg.id_column])
-
-        parts = []
-        for col in text_cols:
-            val = row[col]
-            if pd.isna(val):
-                continue
-            parts.append(f"{col}: {val}")
-
-        combined = "\n".join(parts)
-
-        docs.append(
-            {
-                "id": row_id,  # you can prefix by table name if you want
-                "text": combined,
-                "metadata": {
-                    "source": "msk_chord",
-                    "table_name": table_cfg.name,
-                    "id_column": table_cfg.id_column,
-                    "row_id": row_id,
-                    "row_index": int(idx),
-                },
-            }
-        )
+    # Rows used to be formatted from df.iterrows(), which upcasts a frame
+    # without string columns to one common dtype (an int column next to a
+    # float one renders as "2.0"); do the same so the text is unchanged.
+    row_dtype = df.iloc[:0].to_numpy().dtype
+    if row_dtype != object:
+        df = df.astype(row_dtype)
+
+    # Build "col: val" strings column-by-column (vectorised), blanking NaNs so
+    # they can be skipped when the row is joined.
+    labelled_cols = [_labelled_column(df[col], col) for col in text_cols]
+    if not labelled_cols:
+        combined_texts = [""] * len(df)
+    elif df[text_cols].notna().to_numpy().all():
+        # Nothing to skip: join rows without a Python-level step per row.
+        combined_texts = list(map("\n".join, zip(*labelled_cols)))
+    else:
+        combined_texts = ["\n".join(filter(None, parts)) for parts in zip(*labelled_cols)]
+
+    row_ids = df[table_cfg.id_column].astype(str).tolist()
+
+    docs: List[Dict[str, Any]] = [
+        {
+            "id": row_id,  # you can prefix by table name if you want
+            "text": combined,
+            "metadata": {
+                "source": "msk_chord",
+                "table_name": table_cfg.name,
+                "id_column": table_cfg.id_column,
+                "row_id": row_id,
+                "row_index": int(idx),
+            },
+        }
+        for row_id, combined, idx in zip(row_ids, combined_texts, df.index)
+    ]
 
     return docs
 
@@ -149,67 +249,169 @@ def load_metadata_text(
     }
 
 
-# ---------- High-level: build chunked docs from ALL tables ----------
+# ---------- Chunking of prepared documents ----------
 
-def build_chunked_documents(
-    config: IngestionConfig,
+# (chunk id prefix, base metadata, text) for one document to chunk
+_Source = Tuple[str, Dict[str, Any], str]
+
+
+def _chunk_sources(
+    sources: List[_Source],
+    *,
+    encoder,
+    chunk_token_size: int,
+    chunk_overlap: int,
+    num_threads: int,
 ) -> List[DocChunk]:
     """
-    - For each table in config.tables:
-        - loads its TSV
-        - auto-selects text columns (if none specified)
-        - builds per-row textual docs
-        - chunks them
-    - Also chunks the single metadata text file
-    - Returns a flat list[DocChunk]
+    Tokenise all sources in one multi-threaded call and window the token
+    lists. A document that fits in a single window is its own chunk, so its
+    source text is reused as-is; only multi-window documents are decoded
+    (in one batched call).
     """
-    encoder = get_token_encoder()
-    all_chunks: List[DocChunk] = []
-
-    # 1) Patient-related tables
-    for table_cfg in config.tables:
-        base_docs = _load_table_rows_as_text(table_cfg)
-        for doc in base_docs:
-            base_id = doc["id"]
-            base_meta = doc["metadata"]
-            text = doc["text"]
-
-            text_chunks = chunk_text(
-                text,
-                encoder=encoder,
-                chunk_token_size=config.chunk_token_size,
-                chunk_overlap=config.chunk_overlap,
+    token_lists = encoder.encode_ordinary_batch(
+        [text for _, _, text in sources],
+        num_threads=num_threads,
+    )
+    windows_per_doc = [
+        _token_windows(
+            tokens,
+            chunk_token_size=chunk_token_size,
+            chunk_overlap=chunk_overlap,
+        )
+        for tokens in token_lists
+    ]
+    decoded = iter(
+        encoder.decode_batch(
+            [w for windows in windows_per_doc if len(windows) > 1 for w in windows],
+            num_threads=num_threads,
+        )
+    )
+
+    chunks: List[DocChunk] = []
+    for (prefix, base_meta, text), windows in zip(sources, windows_per_doc):
+        single = len(windows) == 1
+        for i, window in enumerate(windows):
+            chunks.append(
+                DocChunk(
+                    id=f"{prefix}{i}",
+                    text=text if single else next(decoded),
+                    metadata={**base_meta, "chunk_index": i},
+                    n_tokens=len(window),
+                )
             )
 
-            row_index = base_meta["row_index"]
+    return chunks
+
+
+def _process_table(
+    table_cfg: TableConfig,
+    encoder_name: str,
+    chunk_token_size: int,
+    chunk_overlap: int,
+    num_threads: int = 1,
+) -> List[DocChunk]:
+    """Load one table, build its row docs and chunk them (runs in a worker process)."""
+    sources: List[_Source] = []
+    for doc in _load_table_rows_as_text(table_cfg):
+        base_meta = doc["metadata"]
+        prefix = f"{table_cfg.name}:{doc['id']}:{base_meta['row_index']}:chunk_"
+        sources.append((prefix, base_meta, doc["text"]))
+
+    return _chunk_sources(
+        sources,
+        encoder=get_token_encoder(encoder_name),
+        chunk_token_size=chunk_token_size,
+        chunk_overlap=chunk_overlap,
+        num_threads=num_threads,
+    )
+
+
+# ---------- High-level: build chunked docs from ALL tables ----------
+
+def _worker_context() -> BaseContext:
+    """
+    Start method for the table workers. Forking a process that already runs
+    threads (the metadata thread, tiktoken's pool, the indexing workers) can
+    deadlock the child, so use forkserver where available, else spawn.
+    """
+    if "forkserver" in mp.get_all_start_methods():
+        return mp.get_context("forkserver")
+    return mp.get_context("spawn")
 
-            for i, chunk in enumerate(text_chunks):
-                all_chunks.append(
-                    DocChunk(
-                        id=f"{table_cfg.name}:{base_id}:{row_index}:chunk_{i}",
-                        text=chunk,
-                        metadata={**base_meta, "chunk_index": i},
-                    )
-                )
 
-    # 2) Global metadata file
+def _chunk_metadata_file(config: IngestionConfig, num_threads: int) -> List[DocChunk]:
     metadata_doc = load_metadata_text(config.metadata_text_path)
-    meta_chunks = chunk_text(
-        metadata_doc["text"],
-        encoder=encoder,
+    return _chunk_sources(
+        [(f"{metadata_doc['id']}_chunk_", metadata_doc["metadata"], metadata_doc["text"])],
+        encoder=get_token_encoder(TOKEN_ENCODING),
         chunk_token_size=config.chunk_token_size,
         chunk_overlap=config.chunk_overlap,
+        num_threads=num_threads,
     )
-    for i, chunk in enumerate(meta_chunks):
-        all_chunks.append(
-            DocChunk(
-                id=f"{metadata_doc['id']}_chunk_{i}",
-                text=chunk,
-                metadata={
-                    **metadata_doc["metadata"],
-                    "chunk_index": i,
-                },
+
+
+def iter_chunked_documents(
+    config: IngestionConfig,
+) -> Iterator[DocChunk]:
+    """
+    - For each table in config.tables (one worker process per table):
+        - loads its TSV
+        - auto-selects text columns (if none specified)
+        - builds per-row textual docs
+        - chunks them
+    - Also chunks the single metadata text file (on a background thread,
+      concurrently with the tables)
+    - Yields DocChunks table by table, as soon as each table is chunked
+    """
+    n_cpus = os.cpu_count() or 1
+    tables = config.tables
+    n_workers = min(len(tables), n_cpus)
+
+    with ExitStack() as stack:
+        # The process pool comes first, and never forks: callers such as
+        # index_chunks already run this generator on a worker thread.
+        executor = None
+        if len(tables) > 1:
+            executor = stack.enter_context(
+                ProcessPoolExecutor(max_workers=n_workers, mp_context=_worker_context())
             )
-        )
 
-    return all_chunks
+        # tiktoken releases the GIL, so chunking the metadata file on a thread
+        # overlaps with the table work.
+        metadata_executor = stack.enter_context(ThreadPoolExecutor(max_workers=1))
+        metadata_future = metadata_executor.submit(_chunk_metadata_file, config, 1)
+
+        # 1) Patient-related tables
+        if executor is not None:
+            per_table = executor.map(
+                _process_table,
+                tables,
+                repeat(TOKEN_ENCODING),
+                repeat(config.chunk_token_size),
+                repeat(config.chunk_overlap),
+                repeat(max(1, n_cpus // n_workers)),
+            )
+            for table_chunks in per_table:
+                yield from table_chunks
+        else:
+            for table_cfg in tables:
+                yield from _process_table(
+                    table_cfg,
+                    TOKEN_ENCODING,
+                    config.chunk_token_size,
+                    config.chunk_overlap,
+                    n_cpus,
+                )
+
+        # 2) Global metadata file
+        yield from metadata_future.result()
+
+
+def build_chunked_documents(
+    config: IngestionConfig,
+) -> List[DocChunk]:
+    """
+    Same as iter_chunked_documents, but returns a flat list[DocChunk].
+    """
+    return list(iter_chunked_documents(config))
@@ -34,10 +34,52 @@ class IngestionConfig:
     # Chroma persistence
     persist_dir: str = "chroma_db"
     collection_name: str = "patient_docs"
+    # Set chroma_host to use a Chroma server (see README) instead of the
+    # embedded on-disk store in persist_dir.
+    chroma_host: Optional[str] = None
+    chroma_port: int = 8000
 
     # Embeddings
+    # text-embedding-3-small (optionally with embedding_dimensions) is cheaper
+    # and faster, but the model and dimensions must match the ones the
+    # collection was built with, so switching needs a fresh collection.
     embedding_model: str = "text-embedding-3-large"
+    # Shortened vectors (text-embedding-3-* only), e.g. 512; None = full size.
+    embedding_dimensions: Optional[int] = None
+    # L2-normalise vectors before storing/querying. OpenAI embeddings are
+    # already unit length, so this only matters for other providers or when
+    # relying on dot-product/L2 distance matching cosine exactly.
+    normalize_embeddings: bool = False
+
+    # HNSW index (set when the collection is created; ignored for an
+    # existing collection). A lower construction ef builds faster at a small
+    # recall cost; a high sync threshold means fewer index flushes during bulk
+    # ingest. hnsw_search_ef, if set, is applied after ingestion (query-time
+    # recall/latency trade-off; the only knob Chroma lets you change later).
+    distance: str = "l2"
+    hnsw_construction_ef: int = 80
+    hnsw_m: int = 16
+    hnsw_sync_threshold: int = 10000
+    hnsw_batch_size: int = 1000
+    hnsw_search_ef: Optional[int] = None
 
     # Chunking
     chunk_token_size: int = 512
     chunk_overlap: int = 64
+
+    # Indexing
+    # Chunks per embedding request / collection.add. Throughput plateaus
+    # around 1000; OpenAI caps a request at 2048 inputs (and each input at
+    # 8191 tokens), and batches are also packed to the per-request token limit.
+    ingest_batch_size: int = 1000
+    # Don't re-embed/re-add chunks already stored with the same id and text.
+    # Ids are positional, so chunks whose text changed (rows edited in place)
+    # are re-embedded and replaced.
+    skip_existing: bool = True
+    # Switch Chroma's SQLite file to WAL journaling (faster bulk inserts,
+    # slightly weaker durability if the machine crashes mid-ingest).
+    fast_ingest: bool = True
+    # Write with collection.upsert instead of add, so a re-run replaces rows
+    # with the same id. With skip_existing=False every chunk is rewritten;
+    # unchanged texts come from the embedding cache.
+    idempotent: bool = False
@@ -0,0 +1,73 @@
+# src/langgraph_rag/embedding_cache.py
+
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Sequence
+
+import numpy as np
+
+# Keys per "IN (...)" lookup, well under SQLite's bound-parameter limit.
+_LOOKUP_CHUNK = 900
+
+
+def embedding_cache_key(model: str, text: str) -> str:
+    """Content address of one embedding: sha256 over model name and text."""
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding store in a single SQLite file, keyed by
+    embedding_cache_key(). Vectors are stored as float32 bytes (the
+    precision Chroma keeps them at anyway).
+
+    One connection is shared by all threads behind a lock; the indexing
+    workers only touch it briefly per batch.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, List[float]]:
+        """Cached vectors for whichever of `keys` are present."""
+        keys = list(dict.fromkeys(keys))
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            for start in range(0, len(keys), _LOOKUP_CHUNK):
+                part = keys[start:start + _LOOKUP_CHUNK]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})",
+                    part,
+                )
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, keys: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        """Store vectors in one transaction."""
+        rows = [
+            (key, np.asarray(vec, dtype=np.float32).tobytes())
+            for key, vec in zip(keys, vectors)
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,203 @@
+# src/langgraph_rag/embeddings.py
+
+from __future__ import annotations
+
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional
+
+import numpy as np
+from openai import (
+    APIConnectionError,
+    APITimeoutError,
+    InternalServerError,
+    OpenAI,
+    RateLimitError,
+)
+
+from .chunking import get_token_encoder
+from .config import IngestionConfig
+from .embedding_cache import EmbeddingCache, embedding_cache_key
+from .openai_clients import get_openai_client
+from .ratelimit import retry_delay
+
+logger = logging.getLogger(__name__)
+
+# OpenAI accepts at most this many inputs, and this many tokens in total
+# (300k, with some headroom), in one embeddings request. Each input must also
+# stay under 8191 tokens, which chunk_token_size already guarantees.
+MAX_INPUTS_PER_REQUEST = 2048
+MAX_TOKENS_PER_REQUEST = 250_000
+
+# Account quota for the embeddings endpoint, shared by all concurrent
+# indexing batches (see vectorstore.index_chunks_async).
+OPENAI_RPM = float(os.getenv("OPENAI_RPM", "3000"))
+OPENAI_TPM = float(os.getenv("OPENAI_TPM", "1000000"))
+
+# Called as throttle(n_requests, n_tokens) before every embeddings request
+# made in this context (see request_throttle); vectorstore uses it to charge
+# its rate limiter only for texts that actually go to the API.
+_REQUEST_THROTTLE: ContextVar[Optional[Callable[[int, int], None]]] = ContextVar(
+    "embedding_request_throttle", default=None
+)
+
+
+@contextmanager
+def request_throttle(throttle: Callable[[int, int], None]) -> Iterator[None]:
+    """Run embeddings requests made inside this block (and threads started from it) through `throttle`."""
+    token = _REQUEST_THROTTLE.set(throttle)
+    try:
+        yield
+    finally:
+        _REQUEST_THROTTLE.reset(token)
+
+
+# Errors worth retrying: rate limits, dropped connections, timeouts, 5xx.
+_RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+# Give up on a batch once this much time has been spent retrying it.
+MAX_RETRY_SECONDS = 600.0
+
+
+@lru_cache(maxsize=1)
+def _get_client() -> OpenAI:
+    # Same connection pool as the chat calls; retries are handled in
+    # _embed_batch (with Retry-After and jitter).
+    return get_openai_client().with_options(max_retries=0)
+
+
+def _embed_batch(
+    texts: List[str],
+    *,
+    model: str,
+    dimensions: Optional[int] = None,
+    n_tokens: Optional[int] = None,
+) -> List[List[float]]:
+    """
+    One embeddings request, retried with jittered exponential backoff (or
+    the server's Retry-After) on transient errors. Each batch retries on
+    its own, so concurrent batches do not retry in lockstep.
+
+    `n_tokens` (the texts' total token count, if the caller knows it) is
+    what the request throttle is charged; otherwise the texts are tokenized.
+    """
+    # text-embedding-3-* can return shortened vectors; other models reject the argument.
+    extra = {"dimensions": dimensions} if dimensions else {}
+    throttle = _REQUEST_THROTTLE.get()
+    if throttle is not None and n_tokens is None:
+        n_tokens = sum(len(t) for t in get_token_encoder().encode_ordinary_batch(texts))
+    deadline = time.monotonic() + MAX_RETRY_SECONDS
+    attempt = 0
+    while True:
+        if throttle is not None:
+            throttle(1, n_tokens)
+        try:
+            resp = _get_client().embeddings.create(model=model, input=texts, **extra)
+        except _RETRYABLE_ERRORS as e:
+            delay = retry_delay(attempt, e)
+            if time.monotonic() + delay > deadline:
+                raise
+            logger.warning(
+                "Embedding request failed (%s); retrying in %.1fs", type(e).__name__, delay
+            )
+            time.sleep(delay)
+            attempt += 1
+            continue
+
+        # The API returns items with an explicit index; don't rely on order.
+        return [d.embedding for d in sorted(resp.data, key=lambda d: d.index)]
+
+
+def embed_texts(
+    texts: List[str],
+    *,
+    model: str,
+    dimensions: Optional[int] = None,
+    token_counts: Optional[List[int]] = None,
+) -> List[List[float]]:
+    """
+    Embed texts with the OpenAI embeddings endpoint, sending up to
+    MAX_INPUTS_PER_REQUEST texts per request. Vectors come back in input order.
+
+    `token_counts`, one per text, saves re-tokenizing them for the request
+    throttle.
+    """
+    vectors: List[List[float]] = []
+    for start in range(0, len(texts), MAX_INPUTS_PER_REQUEST):
+        end = start + MAX_INPUTS_PER_REQUEST
+        vectors.extend(
+            _embed_batch(
+                texts[start:end],
+                model=model,
+                dimensions=dimensions,
+                n_tokens=None if token_counts is None else sum(token_counts[start:end]),
+            )
+        )
+    return vectors
+
+
+def l2_normalize(vectors: List[List[float]]) -> List[List[float]]:
+    """Scale each vector to unit length in one vectorised NumPy pass (zero vectors stay zero)."""
+    vecs = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+    norms[norms == 0.0] = 1.0
+    vecs /= norms
+    return vecs.tolist()
+
+
+@lru_cache(maxsize=8)
+def _embedding_cache(path: str) -> EmbeddingCache:
+    # One SQLite connection per cache file, however many embedders use it.
+    return EmbeddingCache(path)
+
+
+def get_text_embedder(config: IngestionConfig) -> Callable[..., List[List[float]]]:
+    """
+    Returns an `embedding_fn` for index_chunks that calls the embeddings
+    endpoint directly (many texts per request) instead of going through
+    Chroma's embedding function.
+
+    Vectors are cached on disk in <persist_dir>/embedding_cache.sqlite3,
+    keyed by (model and dimensions, sha256(text)), so re-ingesting mostly unchanged tables
+    only embeds the chunks whose text changed.
+
+    With config.normalize_embeddings, vectors are L2-normalised on the way
+    out (the cache keeps them as returned by the API).
+
+    The embedder also takes `token_counts` (one per text), which index_chunks
+    passes from the chunker so rate limiting needs no second tokenization.
+    """
+    model = config.embedding_model
+    dimensions = config.embedding_dimensions
+    cache_model = f"{model}:{dimensions}" if dimensions else model
+    normalize = config.normalize_embeddings
+    cache = _embedding_cache(str(Path(config.persist_dir) / "embedding_cache.sqlite3"))
+
+    def embed(texts: List[str], token_counts: Optional[List[int]] = None) -> List[List[float]]:
+        keys = [embedding_cache_key(cache_model, t) for t in texts]
+        vectors = cache.get_many(keys)
+
+        misses = {k: i for i, k in enumerate(keys) if k not in vectors}
+        if misses:
+            new_vectors = embed_texts(
+                [texts[i] for i in misses.values()],
+                model=model,
+                dimensions=dimensions,
+                token_counts=(
+                    None if token_counts is None else [token_counts[i] for i in misses.values()]
+                ),
+            )
+            cache.put_many(list(misses), new_vectors)
+            vectors.update(zip(misses, new_vectors))
+
+        out = [vectors[k] for k in keys]
+        return l2_normalize(out) if normalize and out else out
+
+    # Only cache misses reach _embed_batch, which honours request_throttle;
+    # this also marks the embedder as taking token_counts.
+    embed.throttles_requests = True
+    return embed
@@ -2,8 +2,15 @@
 
 from __future__ import annotations
 
+import asyncio
+import builtins
+from dataclasses import replace
+from functools import lru_cache
 from typing import TypedDict, Dict, Any, List
 
+import numpy as np
+import pandas as pd
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, END
 
 from langgraph_rag.llm import (
@@ -11,13 +18,20 @@ from langgraph_rag.llm import (
     generate_planner_plan,
     generate_writer_answer,
     generate_analyst_code,
+    agenerate_oncologist_view,
+    agenerate_planner_plan,
+    agenerate_writer_answer,
+    agenerate_analyst_code,
 )
 from langgraph_rag.config import IngestionConfig
+from langgraph_rag.serialization import SerializedArtifacts, dumps
 from langgraph_rag.tools.cohort_query import (
+    load_available_tables,
     load_tables_from_config,
     execute_cohort_filter_step,
     execute_feature_descriptives_step,
 )
+from langgraph_rag.tools.plan_executor import execute_plan
 
 
 class ChatState(TypedDict, total=False):
@@ -28,14 +42,62 @@ class ChatState(TypedDict, total=False):
     execution_result: Dict[str, Any]
     final_answer: str
 
+    # JSON of the outputs above, encoded once and reused downstream
+    artifacts: SerializedArtifacts
+
     # Optional debug / observability fields
     analyst_generated_code: str
     analyst_error: str
 
+
+def _private_copies(tables: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+    """
+    Per-execution copies of the process-wide cached tables, so in-place edits
+    by generated code (dropna(inplace=True), column assignment, ...) cannot
+    leak into later queries. The columns are Arrow-backed, so a deep copy
+    shares the immutable Arrow arrays and only copies the pandas wrappers;
+    the cohort filter caches are keyed on those arrays, so they still hit.
+    """
+    return {name: df.copy(deep=True) for name, df in tables.items()}
+
+
+def _analyst_load_tables(config: IngestionConfig) -> Dict[str, pd.DataFrame]:
+    return _private_copies(load_tables_from_config(config))
+
+
+# Names available to the Analyst's generated code without importing them.
+# Each execution gets a shallow copy so generated code cannot leak state.
+_ANALYST_GLOBALS: Dict[str, Any] = {
+    "__builtins__": builtins,
+    "pd": pd,
+    "np": np,
+    "load_tables_from_config": _analyst_load_tables,
+    "execute_cohort_filter_step": execute_cohort_filter_step,
+    "execute_feature_descriptives_step": execute_feature_descriptives_step,
+}
+
+
+def _with_serialized(state: ChatState, update: ChatState, **fields: Any) -> ChatState:
+    """Adds `artifacts` to a node's update, with `fields` JSON-encoded from it."""
+    artifacts = state.get("artifacts") or SerializedArtifacts()
+    update["artifacts"] = replace(
+        artifacts,
+        **{f"{field}_json": dumps(update[key]) for field, key in fields.items()},
+    )
+    return update
+
+
+@lru_cache(maxsize=128)
+def _compile_analyst(code: str):
+    """Compile generated analysis code once; identical code reuses the bytecode."""
+    return compile(code, "<analyst_generated>", "exec")
+
+
 def build_rwe_multi_agent_graph(
     config: IngestionConfig,
     *,
     use_smart_analyst: bool = True,
+    include_writer: bool = True,
 ):
     """
     Multi-agent graph:
@@ -46,69 +108,84 @@ def build_rwe_multi_agent_graph(
       - Execute it to obtain execution_result.
 
     Otherwise it can fall back to a simpler/dumb analyst implementation.
+
+    Every LLM-backed node also has an async variant, so `graph.ainvoke(...)`
+    runs on the async OpenAI client and many queries can share one event loop.
+
+    With include_writer=False the graph ends after the analyst, so the caller
+    can stream the final answer itself (see llm.stream_writer_answer).
     """
 
+    # Parse the tables now so the first query does not pay for it; the
+    # Analyst's generated code reads them from TABLES instead of the TSVs.
+    # Missing TSVs are skipped here and in TABLES.
+    load_available_tables(config)
+
     # --- Node 1: Oncologist ---
 
     def oncologist_node(state: ChatState) -> ChatState:
         user_query = state["user_query"]
         view = generate_oncologist_view(user_query)
-        return {"oncologist_view": view}
+        return _with_serialized(state, {"oncologist_view": view}, oncologist_view="oncologist_view")
+
+    async def aoncologist_node(state: ChatState) -> ChatState:
+        view = await agenerate_oncologist_view(state["user_query"])
+        return _with_serialized(state, {"oncologist_view": view}, oncologist_view="oncologist_view")
 
     # --- Node 2: Planner ---
 
     def planner_node(state: ChatState) -> ChatState:
         user_query = state["user_query"]
         oncologist_view = state["oncologist_view"]
-        plan = generate_planner_plan(user_query, oncologist_view)
-        return {"plan": plan}
+        plan = generate_planner_plan(user_query, oncologist_view, artifacts=state.get("artifacts"))
+        return _with_serialized(state, {"plan": plan}, plan="plan")
+
+    async def aplanner_node(state: ChatState) -> ChatState:
+        plan = await agenerate_planner_plan(
+            state["user_query"],
+            state["oncologist_view"],
+            artifacts=state.get("artifacts"),
+        )
+        return _with_serialized(state, {"plan": plan}, plan="plan")
 
     # --- Node 3a: Smart Analyst (code-generating) ---
 
-    def analyst_node_smart(state: ChatState) -> ChatState:
-        user_query = state["user_query"]
-        oncologist_view = state.get("oncologist_view", {})
-        plan = state.get("plan", {})
+    def _code_generation_failed(e: Exception) -> ChatState:
+        execution_result: Dict[str, Any] = {
+            "steps": [],
+            "overall_status": "failed",
+            "notes": "Code generation for Analyst failed.",
+            "error": str(e),
+        }
+        return {
+            "execution_result": execution_result,
+            "analyst_error": str(e),
+        }
 
-        # 1) Generate the analysis code
-        try:
-            code = generate_analyst_code(
-                user_query=user_query,
-                oncologist_view=oncologist_view,
-                plan=plan,
-                config=config,
-            )
-        except Exception as e:
-            execution_result: Dict[str, Any] = {
-                "steps": [],
-                "overall_status": "failed",
-                "notes": "Code generation for Analyst failed.",
-                "error": str(e),
-            }
-            return {
-                "execution_result": execution_result,
-                "analyst_error": str(e),
-            }
+    def _run_generated_code(code: str) -> ChatState:
+        # Truncated once to avoid huge payloads; stored only in
+        # state["analyst_generated_code"] (logged to MLflow from there).
+        code_preview = code[:4000]
 
         # 2) Execute the generated code in an isolated namespace
-        local_ns: Dict[str, Any] = {}
+        namespace: Dict[str, Any] = dict(_ANALYST_GLOBALS)
         try:
-            exec(code, {}, local_ns)
-            if "run_analysis" not in local_ns or not callable(local_ns["run_analysis"]):
+            namespace["TABLES"] = _private_copies(load_available_tables(config))
+            exec(_compile_analyst(code), namespace)
+            if "run_analysis" not in namespace or not callable(namespace["run_analysis"]):
                 raise RuntimeError("Generated code did not define run_analysis()")
 
-            result = local_ns["run_analysis"]()
+            result = namespace["run_analysis"]()
         except Exception as e:
             execution_result = {
                 "steps": [],
                 "overall_status": "failed",
                 "notes": "Execution of generated analysis code failed.",
                 "error": str(e),
-                "generated_code": code[:4000],  # truncate to avoid huge payloads
             }
             return {
                 "execution_result": execution_result,
-                "analyst_generated_code": code[:4000],
+                "analyst_generated_code": code_preview,
                 "analyst_error": str(e),
             }
 
@@ -119,7 +196,6 @@ def build_rwe_multi_agent_graph(
                 "overall_status": "failed",
                 "notes": "Generated analysis code did not return a dict.",
                 "raw_return": str(result),
-                "generated_code": code[:4000],
             }
         else:
             steps = result.get("steps", [])
@@ -132,20 +208,78 @@ def build_rwe_multi_agent_graph(
 
         return {
             "execution_result": execution_result,
-            "analyst_generated_code": code[:4000],
+            "analyst_generated_code": code_preview,
         }
 
+    def analyst_node_smart(state: ChatState) -> ChatState:
+        # 1) Generate the analysis code
+        try:
+            code = generate_analyst_code(
+                user_query=state["user_query"],
+                oncologist_view=state.get("oncologist_view", {}),
+                plan=state.get("plan", {}),
+                config=config,
+                artifacts=state.get("artifacts"),
+            )
+        except Exception as e:
+            return _with_serialized(
+                state, _code_generation_failed(e), execution_result="execution_result"
+            )
+
+        return _with_serialized(
+            state, _run_generated_code(code), execution_result="execution_result"
+        )
+
+    async def aanalyst_node_smart(state: ChatState) -> ChatState:
+        try:
+            code = await agenerate_analyst_code(
+                user_query=state["user_query"],
+                oncologist_view=state.get("oncologist_view", {}),
+                plan=state.get("plan", {}),
+                config=config,
+                artifacts=state.get("artifacts"),
+            )
+        except Exception as e:
+            return _with_serialized(
+                state, _code_generation_failed(e), execution_result="execution_result"
+            )
+
+        # The generated code is blocking pandas work; keep it off the event loop.
+        update = await asyncio.to_thread(_run_generated_code, code)
+        return _with_serialized(state, update, execution_result="execution_result")
+
     # --- Node 3b: (Optional) Dumb Analyst fallback ---
 
     def analyst_node_dumb(state: ChatState) -> ChatState:
-        # You can keep your previous Pandas-based executor here if you like.
-        # For now, just mark it unimplemented.
-        execution_result = {
-            "steps": [],
-            "overall_status": "failed",
-            "notes": "Dumb analyst not implemented; enable use_smart_analyst=True.",
-        }
-        return {"execution_result": execution_result}
+        # Run the plan directly with the built-in tools (no code generation).
+        try:
+            execution_result = execute_plan(
+                state.get("plan", {}),
+                load_tables_from_config(config),
+                config=config,
+                user_query=state["user_query"],
+            )
+        except Exception as e:
+            execution_result = {
+                "steps": [],
+                "overall_status": "failed",
+                "notes": "Plan execution with the built-in tools failed.",
+                "error": str(e),
+            }
+            return _with_serialized(
+                state,
+                {"execution_result": execution_result, "analyst_error": str(e)},
+                execution_result="execution_result",
+            )
+
+        execution_result["notes"] = "Analyst executed the plan with the built-in tools."
+        return _with_serialized(
+            state, {"execution_result": execution_result}, execution_result="execution_result"
+        )
+
+    async def aanalyst_node_dumb(state: ChatState) -> ChatState:
+        # Blocking pandas work; keep it off the event loop.
+        return await asyncio.to_thread(analyst_node_dumb, state)
 
     # --- Node 4: Writer ---
 
@@ -160,27 +294,41 @@ def build_rwe_multi_agent_graph(
             oncologist_view=oncologist_view,
             plan=plan,
             execution_result=execution_result,
+            artifacts=state.get("artifacts"),
         )
 
         return {"final_answer": final_answer}
 
+    async def awriter_node(state: ChatState) -> ChatState:
+        final_answer = await agenerate_writer_answer(
+            user_query=state["user_query"],
+            oncologist_view=state.get("oncologist_view", {}),
+            plan=state.get("plan", {}),
+            execution_result=state.get("execution_result", {}),
+            artifacts=state.get("artifacts"),
+        )
+        return {"final_answer": final_answer}
+
     # --- Assemble the graph ---
 
     graph = StateGraph(ChatState)
-    graph.add_node("oncologist", oncologist_node)
-    graph.add_node("planner", planner_node)
+    graph.add_node("oncologist", RunnableLambda(oncologist_node, afunc=aoncologist_node))
+    graph.add_node("planner", RunnableLambda(planner_node, afunc=aplanner_node))
 
     if use_smart_analyst:
-        graph.add_node("analyst", analyst_node_smart)
+        graph.add_node("analyst", RunnableLambda(analyst_node_smart, afunc=aanalyst_node_smart))
     else:
-        graph.add_node("analyst", analyst_node_dumb)
-
-    graph.add_node("writer", writer_node)
+        graph.add_node("analyst", RunnableLambda(analyst_node_dumb, afunc=aanalyst_node_dumb))
 
     graph.set_entry_point("oncologist")
     graph.add_edge("oncologist", "planner")
     graph.add_edge("planner", "analyst")
-    graph.add_edge("analyst", "writer")
-    graph.add_edge("writer", END)
+
+    if include_writer:
+        graph.add_node("writer", RunnableLambda(writer_node, afunc=awriter_node))
+        graph.add_edge("analyst", "writer")
+        graph.add_edge("writer", END)
+    else:
+        graph.add_edge("analyst", END)
 
     return graph.compile()
@@ -2,17 +2,22 @@
 
 from __future__ import annotations
 
-import json
 import time
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Iterable, Iterator, List
 
 import mlflow
 import pandas as pd
 
 from .config import IngestionConfig, TableConfig
-from .chunking import build_chunked_documents
-from .vectorstore import get_or_create_chroma_collection, index_chunks
+from .serialization import dumps
+from .chunking import DocChunk, iter_chunked_documents
+from .embeddings import get_text_embedder
+from .vectorstore import (
+    get_or_create_chroma_collection,
+    index_chunks,
+    tune_collection_for_queries,
+)
 
 
 def _config_to_dict(config: IngestionConfig) -> Dict[str, Any]:
@@ -30,11 +35,38 @@ def _config_to_dict(config: IngestionConfig) -> Dict[str, Any]:
         "persist_dir": config.persist_dir,
         "collection_name": config.collection_name,
         "embedding_model": config.embedding_model,
+        "embedding_dimensions": config.embedding_dimensions,
+        "normalize_embeddings": config.normalize_embeddings,
         "chunk_token_size": config.chunk_token_size,
         "chunk_overlap": config.chunk_overlap,
+        "ingest_batch_size": config.ingest_batch_size,
+        "skip_existing": config.skip_existing,
+        "fast_ingest": config.fast_ingest,
+        "idempotent": config.idempotent,
+        "distance": config.distance,
+        "hnsw_construction_ef": config.hnsw_construction_ef,
+        "hnsw_m": config.hnsw_m,
+        "hnsw_sync_threshold": config.hnsw_sync_threshold,
+        "hnsw_batch_size": config.hnsw_batch_size,
+        "hnsw_search_ef": config.hnsw_search_ef,
     }
 
 
+def _tally_chunks(
+    chunks: Iterable[DocChunk],
+    stats: Dict[str, int],
+    sample: List[Dict[str, Any]],
+    n_sample: int = 5,
+) -> Iterator[DocChunk]:
+    """Pass chunks through unchanged while counting them and keeping a few samples."""
+    for c in chunks:
+        stats["n_chunks"] += 1
+        stats["total_chars"] += len(c.text)
+        if len(sample) < n_sample:
+            sample.append({"id": c.id, "text": c.text[:300], "metadata": c.metadata})
+        yield c
+
+
 def run_ingestion_with_mlflow(
     config: IngestionConfig,
     *,
@@ -55,8 +87,13 @@ def run_ingestion_with_mlflow(
             "persist_dir": config.persist_dir,
             "collection_name": config.collection_name,
             "embedding_model": config.embedding_model,
+            "embedding_dimensions": config.embedding_dimensions,
             "chunk_token_size": config.chunk_token_size,
             "chunk_overlap": config.chunk_overlap,
+            "ingest_batch_size": config.ingest_batch_size,
+            "skip_existing": config.skip_existing,
+            "fast_ingest": config.fast_ingest,
+            "idempotent": config.idempotent,
             "reset": reset,
         })
         # per-table params
@@ -68,7 +105,7 @@ def run_ingestion_with_mlflow(
         # Save full config as artifact
         artifacts_dir = Path("mlflow_artifacts")
         artifacts_dir.mkdir(exist_ok=True)
-        (artifacts_dir / "config.json").write_text(json.dumps(cfg_dict, indent=2))
+        (artifacts_dir / "config.json").write_text(dumps(cfg_dict))
         mlflow.log_artifact(str(artifacts_dir / "config.json"), artifact_path="config")
 
         # ---- Data loading & basic stats ----
@@ -76,47 +113,58 @@ def run_ingestion_with_mlflow(
         table_row_counts = {}
 
         for t in config.tables:
-            df = pd.read_csv(t.path, sep="\t")
+            # Row counts only need one column; chunking parses the full table.
+            df = pd.read_csv(t.path, sep="\t", engine="pyarrow", usecols=[t.id_column])
             table_row_counts[t.name] = len(df)
             mlflow.log_metric(f"n_rows_{t.name}", len(df))
 
         t_load = time.time()
 
-        # ---- Chunking ----
-        chunks = build_chunked_documents(config)
-        t_chunk = time.time()
+        # ---- Vector store creation ----
+        # Ingestion always passes precomputed embeddings, so its handle skips
+        # Chroma's embedding function; the returned handle keeps it for queries.
+        ingest_collection = get_or_create_chroma_collection(config, pre_embed=True)
+        collection = get_or_create_chroma_collection(config)
+        t_vs_create = time.time()
+
+        # ---- Chunking + indexing (streamed) ----
+        # Chunks flow straight from the chunker into index_chunks, so
+        # embedding starts as soon as the first table is chunked and the full
+        # chunk list is never held in memory; stats are accumulated on the
+        # way through.
+        stats = {"n_chunks": 0, "total_chars": 0}
+        sample: List[Dict[str, Any]] = []
+
+        index_chunks(
+            _tally_chunks(iter_chunked_documents(config), stats, sample),
+            ingest_collection,
+            config.ingest_batch_size,
+            embedding_fn=get_text_embedder(config),
+            skip_existing=config.skip_existing,
+            upsert=config.idempotent,
+        )
+        tune_collection_for_queries(collection, config)
+        t_index = time.time()
 
-        n_chunks = len(chunks)
+        n_chunks = stats["n_chunks"]
         mlflow.log_metric("n_chunks_total", n_chunks)
 
         if n_chunks > 0:
-            avg_len = sum(len(c.text) for c in chunks) / n_chunks
+            avg_len = stats["total_chars"] / n_chunks
             mlflow.log_metric("avg_chunk_length_chars", avg_len)
 
         # log a few sample chunks
-        sample = [
-            {"id": c.id, "text": c.text[:300], "metadata": c.metadata}
-            for c in chunks[:5]
-        ]
-        (artifacts_dir / "sample_chunks.json").write_text(json.dumps(sample, indent=2))
+        (artifacts_dir / "sample_chunks.json").write_text(dumps(sample))
         mlflow.log_artifact(str(artifacts_dir / "sample_chunks.json"),
                             artifact_path="samples")
 
-        # ---- Vector store creation & indexing ----
-        collection = get_or_create_chroma_collection(config)
-        t_vs_create = time.time()
-
-        index_chunks(chunks, collection)  # batched in your updated code
-        t_index = time.time()
-
         # collection count metric
         mlflow.log_metric("collection_count", collection.count())
 
         # ---- Timing metrics ----
         mlflow.log_metric("time_load_data_sec", t_load - t0)
-        mlflow.log_metric("time_chunking_sec", t_chunk - t_load)
-        mlflow.log_metric("time_collection_create_sec", t_vs_create - t_chunk)
-        mlflow.log_metric("time_indexing_sec", t_index - t_vs_create)
+        mlflow.log_metric("time_collection_create_sec", t_vs_create - t_load)
+        mlflow.log_metric("time_chunking_and_indexing_sec", t_index - t_vs_create)
         mlflow.log_metric("time_total_sec", t_index - t0)
 
         return collection, run_id
@@ -2,13 +2,22 @@
 
 from __future__ import annotations
 
-import json
+import asyncio
+import copy
+import hashlib
 import os
-from typing import List, Dict, Any
+import weakref
+from functools import lru_cache
+from typing import AsyncIterator, Dict, Iterator, List, Any
 
-from dotenv import load_dotenv
-from openai import OpenAI
+import tiktoken
+from openai import AsyncOpenAI, OpenAI, RateLimitError
+from .chunking import get_token_encoder
 from .config import IngestionConfig
+from .openai_clients import get_async_openai_client, get_openai_client
+from .ratelimit import AsyncRateLimiter, retry_delay
+from .semantic_cache import SemanticCache
+from .serialization import SerializedArtifacts, dumps, loads
 from .prompts import (
     get_oncologist_system_prompt,
     get_oncologist_prompt_id,
@@ -19,18 +28,83 @@ from .prompts import (
     ANALYST_CODE_SYSTEM_PROMPT,
 )
 
-load_dotenv()
-
-_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 DEFAULT_CHAT_MODEL = os.getenv("OPENAI_CHAT_MODEL", "gpt-4o-mini")
 
+# ---- OpenAI clients ----
+#
+# The OpenAI clients (and their connection pools) are shared with the
+# embedding calls; see openai_clients.
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "10"))
+
+
+def _get_client() -> OpenAI:
+    return get_openai_client()
+
+
+# The semaphore belongs to the event loop it is used on, so keep one per
+# loop; entries go away with their loop.
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _get_async_client() -> tuple[AsyncOpenAI, asyncio.Semaphore]:
+    """
+    Async client for the agenerate_* variants (so several queries can have
+    LLM calls in flight at once), plus the semaphore capping in-flight calls
+    at LLM_MAX_CONCURRENCY on the current event loop.
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return get_async_openai_client(), semaphore
+
+
+@lru_cache(maxsize=256)
+def _embed_query(text: str) -> tuple:
+    resp = _get_client().embeddings.create(
+        model=os.getenv("OPENAI_QUERY_EMBEDDING_MODEL", "text-embedding-3-small"),
+        input=[text],
+    )
+    return tuple(resp.data[0].embedding)
+
+
+def _build_response_cache() -> SemanticCache:
+    # Exact-match only by default. Paraphrase matching is opt-in: e.g. "male
+    # NSCLC patients" and "female NSCLC patients" embed very close together,
+    # so pick the threshold with care.
+    threshold = os.getenv("LLM_SEMANTIC_CACHE_THRESHOLD")
+    return SemanticCache(
+        maxsize=int(os.getenv("LLM_RESPONSE_CACHE_SIZE", "256")),
+        embed_fn=_embed_query if threshold else None,
+        threshold=float(threshold) if threshold else 0.92,
+    )
+
+
+# Oncologist/planner outputs are pure functions of (prompt, model, inputs),
+# so repeated or paraphrased questions can skip the API call entirely.
+_response_cache = _build_response_cache()
+
+
+def _oncologist_cache_namespace(model: str | None) -> str:
+    return f"oncologist|{get_oncologist_prompt_id()}|{model or DEFAULT_CHAT_MODEL}"
+
+
+def _planner_cache_namespace(oncologist_view: Dict[str, Any], model: str | None) -> str:
+    view_digest = hashlib.sha256(
+        dumps(oncologist_view, indent=False, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+    return f"planner|{get_planner_prompt_id()}|{model or DEFAULT_CHAT_MODEL}|{view_digest}"
+
 
 def _chat_completion(messages: List[Dict[str, str]], model: str | None = None) -> str:
     """Small helper to hit the OpenAI chat completion endpoint and return content."""
     if model is None:
         model = DEFAULT_CHAT_MODEL
 
-    resp = _client.chat.completions.create(
+    resp = _get_client().chat.completions.create(
         model=model,
         messages=messages,
         temperature=0.2,
@@ -38,25 +112,214 @@ def _chat_completion(messages: List[Dict[str, str]], model: str | None = None) -
     return resp.choices[0].message.content.strip()
 
 
+async def _chat_completion_async(
+    messages: List[Dict[str, str]],
+    model: str | None = None,
+) -> str:
+    """Async counterpart of _chat_completion."""
+    if model is None:
+        model = DEFAULT_CHAT_MODEL
+
+    client, semaphore = _get_async_client()
+    async with semaphore:
+        resp = await client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=0.2,
+        )
+    return resp.choices[0].message.content.strip()
+
+
+def _chat_completion_stream(
+    messages: List[Dict[str, str]],
+    model: str | None = None,
+) -> Iterator[str]:
+    """Like _chat_completion, but yields content deltas as they arrive."""
+    if model is None:
+        model = DEFAULT_CHAT_MODEL
+
+    stream = _get_client().chat.completions.create(
+        model=model,
+        messages=messages,
+        temperature=0.2,
+        stream=True,
+    )
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+async def _chat_completion_stream_async(
+    messages: List[Dict[str, str]],
+    model: str | None = None,
+) -> AsyncIterator[str]:
+    """Async counterpart of _chat_completion_stream."""
+    if model is None:
+        model = DEFAULT_CHAT_MODEL
+
+    client, semaphore = _get_async_client()
+    async with semaphore:
+        stream = await client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=0.2,
+            stream=True,
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+@lru_cache(maxsize=8)
+def _chat_encoder(model: str):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return get_token_encoder()
+
+
+def _estimate_prompt_tokens(messages: List[Dict[str, str]], model: str) -> int:
+    """Approximate prompt size (content tokens + a few per message for role framing)."""
+    encoder = _chat_encoder(model)
+    return sum(len(encoder.encode_ordinary(m["content"])) + 4 for m in messages)
+
+
+# ---- Prompt size guard ----
+
+# JSON blocks inlined into the analyst/writer prompts get per-block token
+# budgets (fractions of the model context) summing to ~60% of it.
+CONTEXT_WINDOW_TOKENS = int(os.getenv("LLM_CONTEXT_TOKENS", "128000"))
+
+_TRUNCATION_MARKER = "...[truncated]"
+
+
+def _shrink(obj: Any, max_items: int, max_chars: int) -> Any:
+    """Copy of obj with lists cut to max_items and strings to max_chars."""
+    if isinstance(obj, dict):
+        out = {}
+        for k, v in obj.items():
+            # A few example ids are enough for the writer.
+            limit = min(max_items, 3) if k == "sample_patient_ids" else max_items
+            out[k] = _shrink(v, limit, max_chars)
+        return out
+    if isinstance(obj, (list, tuple)):
+        items = [_shrink(v, max_items, max_chars) for v in obj[:max_items]]
+        if len(obj) > max_items:
+            items.append(f"{_TRUNCATION_MARKER} ({len(obj) - max_items} more items)")
+        return items
+    if isinstance(obj, str) and len(obj) > max_chars:
+        return obj[:max_chars] + _TRUNCATION_MARKER
+    return obj
+
+
+def _truncate_json(
+    obj: Any,
+    max_tokens: int,
+    model: str | None = None,
+    *,
+    text: str | None = None,
+) -> str:
+    """
+    JSON-dump obj for a prompt, shrinking it until it fits in max_tokens:
+    first by trimming long lists/strings, then by a hard token cut.
+
+    `text` may carry obj's JSON if it was already serialized.
+    """
+    if text is None:
+        text = dumps(obj)
+    # A token never covers less than one byte, so short payloads need no count.
+    if len(text.encode("utf-8")) <= max_tokens:
+        return text
+
+    encoder = _chat_encoder(model or DEFAULT_CHAT_MODEL)
+    tokens = encoder.encode_ordinary(text)
+    for max_items, max_chars in ((50, 4000), (20, 2000), (10, 1000), (3, 300)):
+        if len(tokens) <= max_tokens:
+            return text
+        text = dumps(_shrink(copy.deepcopy(obj), max_items, max_chars))
+        tokens = encoder.encode_ordinary(text)
+
+    if len(tokens) <= max_tokens:
+        return text
+    marker = f"\n{_TRUNCATION_MARKER}"
+    keep = max(max_tokens - len(encoder.encode_ordinary(marker)), 0)
+    return encoder.decode(tokens[:keep]) + marker
+
+
+def _block_budget(fraction: float) -> int:
+    return int(CONTEXT_WINDOW_TOKENS * fraction)
+
+
+class RateLimitedLLMClient:
+    """
+    Runs many chat completions concurrently while staying under a
+    concurrency cap and the account's requests/tokens-per-minute limits.
+
+    Limits default to the env vars LLM_MAX_CONCURRENCY, OPENAI_CHAT_RPM and
+    OPENAI_CHAT_TPM. Rate-limit errors are retried (honouring Retry-After)
+    up to `max_attempts` times per call.
+
+    Usage (e.g. an eval run):
+        client = RateLimitedLLMClient()
+        answers = await client.run_batch([messages_1, messages_2, ...])
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int | None = None,
+        max_requests_per_minute: float | None = None,
+        max_tokens_per_minute: float | None = None,
+        max_attempts: int = 5,
+    ) -> None:
+        if max_concurrent is None:
+            max_concurrent = int(os.getenv("LLM_MAX_CONCURRENCY", "10"))
+        if max_requests_per_minute is None:
+            max_requests_per_minute = float(os.getenv("OPENAI_CHAT_RPM", "500"))
+        if max_tokens_per_minute is None:
+            max_tokens_per_minute = float(os.getenv("OPENAI_CHAT_TPM", "200000"))
+
+        self.max_attempts = max_attempts
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._limiter = AsyncRateLimiter(max_requests_per_minute, max_tokens_per_minute)
+
+    async def complete(self, messages: List[Dict[str, str]], model: str | None = None) -> str:
+        model = model or DEFAULT_CHAT_MODEL
+        n_tokens = _estimate_prompt_tokens(messages, model)
+
+        async with self._semaphore:
+            for attempt in range(self.max_attempts):
+                await self._limiter.acquire(n_requests=1, n_tokens=n_tokens)
+                try:
+                    return await _chat_completion_async(messages, model=model)
+                except RateLimitError as e:
+                    if attempt == self.max_attempts - 1:
+                        raise
+                    await asyncio.sleep(retry_delay(attempt, e))
+
+        raise RuntimeError("max_attempts must be >= 1")
+
+    async def run_batch(
+        self,
+        message_lists: List[List[Dict[str, str]]],
+        model: str | None = None,
+    ) -> List[str]:
+        """Complete every message list concurrently; results are in input order."""
+        return await asyncio.gather(*(self.complete(m, model=model) for m in message_lists))
+
+
 def _safe_json_parse(text: str) -> Dict[str, Any]:
     """Try to parse JSON; if it fails, wrap the raw text."""
     try:
-        return json.loads(text)
-    except Exception:
+        return loads(text)
+    except ValueError:
         return {"raw_text": text, "parse_error": True}
 
 
 # -------- Oncologist: interpret query and produce oncologist_view JSON --------
 
-def generate_oncologist_view(
-    user_query: str,
-    model: str | None = None,
-) -> Dict[str, Any]:
-    system_prompt = get_oncologist_system_prompt()
-    prompt_id = get_oncologist_prompt_id()
-
-    messages = [
-        {"role": "system", "content": system_prompt},
+def _oncologist_messages(user_query: str) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": get_oncologist_system_prompt()},
         {
             "role": "user",
             "content": (
@@ -67,9 +330,43 @@ def generate_oncologist_view(
         },
     ]
 
-    raw = _chat_completion(messages, model=model)
+
+def _oncologist_view_from_raw(raw: str) -> Dict[str, Any]:
     view = _safe_json_parse(raw)
-    view["_prompt_id"] = prompt_id  # useful for MLflow later
+    view["_prompt_id"] = get_oncologist_prompt_id()  # useful for MLflow later
+    return view
+
+
+def generate_oncologist_view(
+    user_query: str,
+    model: str | None = None,
+) -> Dict[str, Any]:
+    namespace = _oncologist_cache_namespace(model)
+    cached = _response_cache.get(namespace, user_query)
+    if cached is not None:
+        return cached
+
+    raw = _chat_completion(_oncologist_messages(user_query), model=model)
+    view = _oncologist_view_from_raw(raw)
+    if not view.get("parse_error"):  # don't replay a malformed response
+        _response_cache.put(namespace, user_query, view)
+    return view
+
+
+async def agenerate_oncologist_view(
+    user_query: str,
+    model: str | None = None,
+) -> Dict[str, Any]:
+    namespace = _oncologist_cache_namespace(model)
+    # Semantic lookups may call the embeddings API, so keep them off the loop.
+    cached = await asyncio.to_thread(_response_cache.get, namespace, user_query)
+    if cached is not None:
+        return cached
+
+    raw = await _chat_completion_async(_oncologist_messages(user_query), model=model)
+    view = _oncologist_view_from_raw(raw)
+    if not view.get("parse_error"):
+        await asyncio.to_thread(_response_cache.put, namespace, user_query, view)
     return view
 
 
@@ -85,58 +382,110 @@ METADATA_PATH = (
     / "msk_chord.txt"
 )
 
-def generate_planner_plan(user_query: str, oncologist_view: Dict[str, Any], model: str | None = None) -> Dict[str, Any]:
-    system_prompt = get_planner_system_prompt()
-    prompt_id = get_planner_prompt_id()
-
-    oncologist_view_json = json.dumps(oncologist_view, indent=2)
 
+@lru_cache(maxsize=1)
+def _get_metadata_text() -> str:
+    # The metadata file is static; read it once instead of on every planner call.
     try:
-        metadata_text = METADATA_PATH.read_text()
+        return METADATA_PATH.read_text()
     except FileNotFoundError:
-        metadata_text = "Dataset metadata file not found."
+        return "Dataset metadata file not found."
+
+
+def _planner_messages(
+    user_query: str,
+    oncologist_view: Dict[str, Any],
+    artifacts: SerializedArtifacts | None = None,
+) -> List[Dict[str, str]]:
+    oncologist_view_json = (
+        artifacts.oncologist_view_json
+        if artifacts and artifacts.oncologist_view_json is not None
+        else dumps(oncologist_view)
+    )
 
-    messages = [
-        {"role": "system", "content": system_prompt},
+    # Static content (prompt, metadata, instructions) goes first and stays
+    # byte-identical across queries so the provider's prompt-prefix cache can
+    # reuse it; only the per-query parts follow.
+    return [
         {
-            "role": "user",
+            "role": "system",
             "content": (
-                "Original user question:\n"
-                f"{user_query}\n\n"
-                "Oncologist agent interpretation (JSON):\n"
-                f"{oncologist_view_json}\n\n"
+                f"{get_planner_system_prompt()}\n\n"
                 "Dataset metadata (table and column information):\n"
-                f"{metadata_text}\n\n"
+                f"{_get_metadata_text()}\n\n"
                 "Using ONLY the table and column names mentioned in this metadata, "
                 "produce the plan JSON following the specified schema. "
                 "Do not invent new table or column names."
             ),
         },
+        {
+            "role": "user",
+            "content": (
+                "Original user question:\n"
+                f"{user_query}\n\n"
+                "Oncologist agent interpretation (JSON):\n"
+                f"{oncologist_view_json}"
+            ),
+        },
     ]
 
-    raw = _chat_completion(messages, model=model)
+
+def _plan_from_raw(raw: str) -> Dict[str, Any]:
     plan = _safe_json_parse(raw)
-    plan["_prompt_id"] = prompt_id
+    plan["_prompt_id"] = get_planner_prompt_id()
     return plan
 
-# --------- Analyst: execute plan steps (code generation) --------
-def generate_analyst_code(
+
+def generate_planner_plan(
     user_query: str,
     oncologist_view: Dict[str, Any],
-    plan: Dict[str, Any],
-    config: IngestionConfig,
     model: str | None = None,
-) -> str:
-    """
-    Use a (possibly code-specialized) LLM to generate a Python function
-    `run_analysis()` that implements the Planner's execution plan.
+    *,
+    artifacts: SerializedArtifacts | None = None,
+) -> Dict[str, Any]:
+    namespace = _planner_cache_namespace(oncologist_view, model)
+    cached = _response_cache.get(namespace, user_query)
+    if cached is not None:
+        return cached
+
+    raw = _chat_completion(_planner_messages(user_query, oncologist_view, artifacts), model=model)
+    plan = _plan_from_raw(raw)
+    if not plan.get("parse_error"):  # don't replay a malformed response
+        _response_cache.put(namespace, user_query, plan)
+    return plan
 
-    The generated code must follow the contract defined in
-    ANALYST_CODE_SYSTEM_PROMPT.
-    """
 
-    oncologist_json = json.dumps(oncologist_view, indent=2)
-    plan_json = json.dumps(plan, indent=2)
+async def agenerate_planner_plan(
+    user_query: str,
+    oncologist_view: Dict[str, Any],
+    model: str | None = None,
+    *,
+    artifacts: SerializedArtifacts | None = None,
+) -> Dict[str, Any]:
+    namespace = _planner_cache_namespace(oncologist_view, model)
+    cached = await asyncio.to_thread(_response_cache.get, namespace, user_query)
+    if cached is not None:
+        return cached
+
+    raw = await _chat_completion_async(_planner_messages(user_query, oncologist_view, artifacts), model=model)
+    plan = _plan_from_raw(raw)
+    if not plan.get("parse_error"):
+        await asyncio.to_thread(_response_cache.put, namespace, user_query, plan)
+    return plan
+
+# --------- Analyst: execute plan steps (code generation) --------
+def _analyst_messages(
+    user_query: str,
+    oncologist_view: Dict[str, Any],
+    plan: Dict[str, Any],
+    config: IngestionConfig,
+    artifacts: SerializedArtifacts | None = None,
+) -> List[Dict[str, str]]:
+    artifacts = artifacts or SerializedArtifacts()
+    oncologist_json = _truncate_json(
+        oncologist_view, _block_budget(0.2), text=artifacts.oncologist_view_json
+    )
+    plan_json = _truncate_json(plan, _block_budget(0.4), text=artifacts.plan_json)
 
     # Build a small schema of available tables from the ingestion config
     table_infos = []
@@ -145,22 +494,15 @@ def generate_analyst_code(
         table_infos.append(f"- logical_name: {t.name}, path: {t.path}")
     tables_text = "\n".join(table_infos)
 
-    user_content = f"""
-        User question:
-        {user_query}
-
-        Oncologist interpretation (JSON):
-        {oncologist_json}
-
-        Planner execution plan (JSON):
-        {plan_json}
-
+    # Static block first (tables + requirements depend only on the config), then
+    # the per-query JSON, so consecutive calls share a cacheable prompt prefix.
+    static_content = f"""
         Available tables (logical_name and TSV path):
         {tables_text}
 
         REQUIREMENTS RECAP:
         - Implement EXACTLY one function: `def run_analysis():`
-        - Use pandas to load the TSV files above.
+        - Read tables from the preloaded `TABLES` dict by logical_name (fall back to the TSV path only if missing).
         - Follow the steps in plan["execution_plan"] in order.
         - For a step with tool == "cohort_sql":
             - Filter the DataFrame using the `filter` dict (keys are column names, values are filter values).
@@ -180,36 +522,84 @@ def generate_analyst_code(
         and `return result` at the end of run_analysis().
         """
 
-    messages = [
-        {"role": "system", "content": ANALYST_CODE_SYSTEM_PROMPT},
+    user_content = f"""
+        User question:
+        {user_query}
+
+        Oncologist interpretation (JSON):
+        {oncologist_json}
+
+        Planner execution plan (JSON):
+        {plan_json}
+        """
+
+    return [
+        {"role": "system", "content": ANALYST_CODE_SYSTEM_PROMPT + static_content},
         {"role": "user", "content": user_content},
     ]
 
+
+def _analyst_code_model(model: str | None) -> str | None:
     # Allow overriding with a code-optimized model via env; fallback to your default chat model
-    code_model = model or os.getenv("OPENAI_CODE_MODEL") or os.getenv("OPENAI_MODEL")  # or DEFAULT_CHAT_MODEL
-    raw = _chat_completion(messages, model=code_model)
+    return model or os.getenv("OPENAI_CODE_MODEL") or os.getenv("OPENAI_MODEL")  # or DEFAULT_CHAT_MODEL
+
+
+def generate_analyst_code(
+    user_query: str,
+    oncologist_view: Dict[str, Any],
+    plan: Dict[str, Any],
+    config: IngestionConfig,
+    model: str | None = None,
+    *,
+    artifacts: SerializedArtifacts | None = None,
+) -> str:
+    """
+    Use a (possibly code-specialized) LLM to generate a Python function
+    `run_analysis()` that implements the Planner's execution plan.
+
+    The generated code must follow the contract defined in
+    ANALYST_CODE_SYSTEM_PROMPT.
+    """
+    messages = _analyst_messages(user_query, oncologist_view, plan, config, artifacts)
+    raw = _chat_completion(messages, model=_analyst_code_model(model))
 
     # The model must return pure Python code (no backticks)
     return raw.strip()
 
-# -------- Writer: final user-facing answer (markdown) --------
 
-def generate_writer_answer(
+async def agenerate_analyst_code(
     user_query: str,
     oncologist_view: Dict[str, Any],
     plan: Dict[str, Any],
-    execution_result: Dict[str, Any],
+    config: IngestionConfig,
     model: str | None = None,
+    *,
+    artifacts: SerializedArtifacts | None = None,
 ) -> str:
-    system_prompt = get_writer_system_prompt()
-    prompt_id = get_writer_prompt_id()
+    messages = _analyst_messages(user_query, oncologist_view, plan, config, artifacts)
+    raw = await _chat_completion_async(messages, model=_analyst_code_model(model))
+    return raw.strip()
 
-    oncologist_json = json.dumps(oncologist_view, indent=2)
-    plan_json = json.dumps(plan, indent=2)
-    exec_json = json.dumps(execution_result, indent=2)
+# -------- Writer: final user-facing answer (markdown) --------
 
-    messages = [
-        {"role": "system", "content": system_prompt},
+def _writer_messages(
+    user_query: str,
+    oncologist_view: Dict[str, Any],
+    plan: Dict[str, Any],
+    execution_result: Dict[str, Any],
+    artifacts: SerializedArtifacts | None = None,
+) -> List[Dict[str, str]]:
+    artifacts = artifacts or SerializedArtifacts()
+    oncologist_json = _truncate_json(
+        oncologist_view, _block_budget(0.1), text=artifacts.oncologist_view_json
+    )
+    plan_json = _truncate_json(plan, _block_budget(0.15), text=artifacts.plan_json)
+    exec_json = _truncate_json(
+        execution_result, _block_budget(0.35), text=artifacts.execution_result_json
+    )
+
+    return [
+        {"role": "system", "content": get_writer_system_prompt()},
         {
             "role": "user",
             "content": (
@@ -226,6 +616,60 @@ def generate_writer_answer(
         },
     ]
 
-    answer = _chat_completion(messages, model=model)
-    # you might later include prompt_id in MLflow; for now we just return the answer
-    return answer
+
+def generate_writer_answer(
+    user_query: str,
+    oncologist_view: Dict[str, Any],
+    plan: Dict[str, Any],
+    execution_result: Dict[str, Any],
+    model: str | None = None,
+    *,
+    artifacts: SerializedArtifacts | None = None,
+) -> str:
+    messages = _writer_messages(user_query, oncologist_view, plan, execution_result, artifacts)
+    # you might later include get_writer_prompt_id() in MLflow; for now we just return the answer
+    return _chat_completion(messages, model=model)
+
+
+async def agenerate_writer_answer(
+    user_query: str,
+    oncologist_view: Dict[str, Any],
+    plan: Dict[str, Any],
+    execution_result: Dict[str, Any],
+    model: str | None = None,
+    *,
+    artifacts: SerializedArtifacts | None = None,
+) -> str:
+    messages = _writer_messages(user_query, oncologist_view, plan, execution_result, artifacts)
+    return await _chat_completion_async(messages, model=model)
+
+
+def stream_writer_answer(
+    user_query: str,
+    oncologist_view: Dict[str, Any],
+    plan: Dict[str, Any],
+    execution_result: Dict[str, Any],
+    model: str | None = None,
+    *,
+    artifacts: SerializedArtifacts | None = None,
+) -> Iterator[str]:
+    """
+    Streaming variant of generate_writer_answer: yields the answer as it is
+    generated (e.g. for st.write_stream), so the first words show up without
+    waiting for the whole completion.
+    """
+    messages = _writer_messages(user_query, oncologist_view, plan, execution_result, artifacts)
+    return _chat_completion_stream(messages, model=model)
+
+
+def astream_writer_answer(
+    user_query: str,
+    oncologist_view: Dict[str, Any],
+    plan: Dict[str, Any],
+    execution_result: Dict[str, Any],
+    model: str | None = None,
+    *,
+    artifacts: SerializedArtifacts | None = None,
+) -> AsyncIterator[str]:
+    messages = _writer_messages(user_query, oncologist_view, plan, execution_result, artifacts)
+    return _chat_completion_stream_async(messages, model=model)
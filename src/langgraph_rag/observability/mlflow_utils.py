@@ -2,12 +2,80 @@
 
 from __future__ import annotations
 
+import atexit
+import logging
+import queue
+import tempfile
+import threading
 import time
-from typing import Any, Dict, Optional
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
 
 import mlflow
+from mlflow.entities import Metric, Param
 from mlflow.tracking import MlflowClient
 
+from langgraph_rag.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+_experiment_id: Optional[str] = None
+# Run started by start_query_run on this thread (Streamlit runs each session
+# on its own thread), used when finish_query_run is not given a run_id.
+_local = threading.local()
+
+
+@lru_cache(maxsize=1)
+def _get_client() -> MlflowClient:
+    """One client for the whole process (it picks up the tracking URI on creation)."""
+    return MlflowClient()
+
+
+# ---------- Background logging ----------
+
+# MLflow REST calls run on one daemon thread so the UI never waits on them;
+# the queue is drained at interpreter exit.
+_QUEUE: "queue.Queue[Optional[Callable[[], None]]]" = queue.Queue()
+_worker: Optional[threading.Thread] = None
+_worker_lock = threading.Lock()
+
+
+def _worker_loop() -> None:
+    while True:
+        task = _QUEUE.get()
+        try:
+            if task is None:
+                return
+            task()
+        except Exception:
+            logger.exception("Background MLflow logging failed")
+        finally:
+            _QUEUE.task_done()
+
+
+def _submit(task: Callable[[], None]) -> None:
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_worker_loop, name="mlflow-logger", daemon=True)
+            _worker.start()
+    _QUEUE.put(task)
+
+
+def flush(timeout: Optional[float] = 30.0) -> None:
+    """Wait for all queued MLflow writes to finish (called automatically at exit)."""
+    worker = _worker
+    if worker is None or not worker.is_alive():
+        return
+    _QUEUE.put(None)
+    worker.join(timeout)
+
+
+atexit.register(flush)
+
+
+# ---------- Public API ----------
 
 def init_mlflow(
     experiment_name: str = "langgraph_rag_e2e",
@@ -18,9 +86,12 @@ def init_mlflow(
 
     Call this once at app startup.
     """
+    global _experiment_id
+
     if tracking_uri:
         mlflow.set_tracking_uri(tracking_uri)
-    mlflow.set_experiment(experiment_name)
+        _get_client.cache_clear()
+    _experiment_id = mlflow.set_experiment(experiment_name).experiment_id
 
 
 def start_query_run(user_query: str) -> tuple[str, float]:
@@ -32,44 +103,79 @@ def start_query_run(user_query: str) -> tuple[str, float]:
       - start_time: timestamp to compute total latency
     """
     start_time = time.time()
-    run = mlflow.start_run(run_name="rag_query")
+    if _experiment_id is None:
+        init_mlflow()
+
+    client = _get_client()
+    run = client.create_run(_experiment_id, run_name="rag_query")
     run_id = run.info.run_id
+    _local.run_id = run_id
 
     # Log basic context as params
-    mlflow.log_param("user_query", user_query[:300])
+    client.log_param(run_id, "user_query", user_query[:300])
 
     return run_id, start_time
 
 
+def _write_run_outputs(
+    run_id: str,
+    metrics: List[Metric],
+    files: Dict[str, str],
+) -> None:
+    client = _get_client()
+    client.log_batch(run_id, metrics=metrics)
+
+    # All artifacts go up in one log_artifacts call.
+    if files:
+        with tempfile.TemporaryDirectory() as tmp:
+            for name, content in files.items():
+                (Path(tmp) / name).write_text(content, encoding="utf-8")
+            client.log_artifacts(run_id, tmp)
+
+    client.set_terminated(run_id)
+
+
 def finish_query_run(
     start_time: float,
     result: Dict[str, Any],
+    run_id: Optional[str] = None,
 ) -> None:
     """
     Finish the MLflow run for this query.
 
-    Assumes there is an active run.
+    Uses the run started by start_query_run on this thread unless run_id is given.
     Logs:
       - total latency
       - full multi-agent result as artifacts (optional, but very useful)
+
+    The outputs are serialized here; the MLflow writes happen in the
+    background, so this returns immediately.
     """
-    total_latency_ms = (time.time() - start_time) * 1000.0
-    mlflow.log_metric("total_latency_ms", total_latency_ms)
+    run_id = run_id or getattr(_local, "run_id", None)
+    if run_id is None:
+        raise RuntimeError("No MLflow run to finish; call start_query_run first.")
+    _local.run_id = None
 
-    # Optional: log structured agent outputs if present
-    oncologist_view = result.get("oncologist_view")
-    plan = result.get("plan")
-    execution_result = result.get("execution_result")
+    now = time.time()
+    total_latency_ms = (now - start_time) * 1000.0
+    metrics = [Metric("total_latency_ms", total_latency_ms, int(now * 1000), 0)]
 
-    if oncologist_view is not None:
-        mlflow.log_dict(oncologist_view, "oncologist_view.json")
-    if plan is not None:
-        mlflow.log_dict(plan, "plan.json")
-    if execution_result is not None:
-        mlflow.log_dict(execution_result, "execution_result.json")
+    # Optional: log structured agent outputs if present, reusing the JSON
+    # the graph already produced (result["artifacts"]) where available
+    artifacts = result.get("artifacts")
+    files: Dict[str, str] = {}
+    for key in ("oncologist_view", "plan", "execution_result"):
+        value = result.get(key)
+        if value is None:
+            continue
+        text = getattr(artifacts, f"{key}_json", None)
+        files[f"{key}.json"] = text if text is not None else dumps(value)
 
-    # Close the run
-    mlflow.end_run()
+    analyst_generated_code = result.get("analyst_generated_code")
+    if analyst_generated_code:
+        files["analyst_generated_code.py"] = analyst_generated_code
+
+    _submit(lambda: _write_run_outputs(run_id, metrics, files))
 
 
 def log_feedback(
@@ -82,19 +188,13 @@ def log_feedback(
 
     - useful: True for 👍, False for 👎
     - comment: optional free-text explanation
+
+    Queued for the background logger; returns immediately.
     """
-    client = MlflowClient()
-
-    client.log_metric(
-        run_id,
-        "user_feedback_useful",
-        1.0 if useful else 0.0,
-    )
-
-    if comment:
-        # Store short comment as a param; truncate if too long
-        client.log_param(
-            run_id,
-            "user_feedback_comment",
-            comment[:500],
-        )
+    metrics = [
+        Metric("user_feedback_useful", 1.0 if useful else 0.0, int(time.time() * 1000), 0)
+    ]
+    # Store short comment as a param; truncate if too long
+    params = [Param("user_feedback_comment", comment[:500])] if comment else []
+
+    _submit(lambda: _get_client().log_batch(run_id, metrics=metrics, params=params))
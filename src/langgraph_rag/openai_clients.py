@@ -0,0 +1,61 @@
+# src/langgraph_rag/openai_clients.py
+
+from __future__ import annotations
+
+import asyncio
+import os
+import weakref
+from functools import lru_cache
+
+import httpx
+from dotenv import load_dotenv
+from openai import AsyncOpenAI, OpenAI
+
+# Resolved once at import; .env is only read when the environment lacks the key.
+_OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+if not _OPENAI_API_KEY:
+    load_dotenv()
+    _OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+
+
+def get_openai_api_key() -> str:
+    """The OpenAI API key; raises on first use (not on import) if it is missing."""
+    if not _OPENAI_API_KEY:
+        raise RuntimeError(
+            "OPENAI_API_KEY is not set. "
+            "Set it in your environment or .env file."
+        )
+    return _OPENAI_API_KEY
+
+
+# Built on first use (importing this module needs no API key) and shared by
+# chat and embedding calls, so every request reuses one keep-alive
+# connection pool.
+
+_HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=50)
+_HTTP_TIMEOUT = httpx.Timeout(60.0)
+
+
+@lru_cache(maxsize=1)
+def get_openai_client() -> OpenAI:
+    http_client = httpx.Client(limits=_HTTP_LIMITS, timeout=_HTTP_TIMEOUT)
+    return OpenAI(api_key=get_openai_api_key(), http_client=http_client)
+
+
+# An async connection pool belongs to the event loop it is used on, so keep
+# one per loop; entries go away with their loop.
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_async_openai_client() -> AsyncOpenAI:
+    """Shared AsyncOpenAI client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        http_client = httpx.AsyncClient(limits=_HTTP_LIMITS, timeout=_HTTP_TIMEOUT)
+        client = _async_clients[loop] = AsyncOpenAI(
+            api_key=get_openai_api_key(), http_client=http_client
+        )
+    return client
@@ -104,7 +104,7 @@ You are an expert Python data engineer and data scientist.
 
 Your job is to write a single self-contained Python function named `run_analysis()`.
 The function will:
-  - Use pandas to load TSV files from the provided file paths.
+  - Read the tables from the preloaded global dict `TABLES` (logical_name -> pandas DataFrame).
   - Follow an analysis plan consisting of ordered steps.
   - Each step may specify:
       - a tool (e.g. "cohort_sql", "feature_descriptives"),
@@ -118,7 +118,8 @@ STRICT REQUIREMENTS:
 - You MUST define a function with the exact signature: `def run_analysis():`
 - Inside run_analysis():
     - Import what you need (e.g. `import pandas as pd`, `import numpy as np`).
-    - Load tables using the provided logical names and file paths.
+    - Get tables with `TABLES[logical_name]`; do NOT modify these DataFrames in place (use .copy() if needed).
+    - Only if a logical name is missing from `TABLES`, load it with pandas from the provided file path.
     - Implement each plan step in order.
     - Handle missing columns/tables gracefully with try/except and record an error in the step result.
 - The function MUST return a dict with the following top-level keys:
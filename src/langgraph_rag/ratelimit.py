@@ -0,0 +1,103 @@
+# src/langgraph_rag/ratelimit.py
+
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+
+
+class AsyncRateLimiter:
+    """
+    Token-bucket limiter over requests/minute and tokens/minute.
+
+    Both buckets start full and refill continuously. `acquire()` waits
+    (polling every `tick` seconds) until both have room for the call, so one
+    limiter can be shared by every coroutine hitting the same API quota.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float,
+        tokens_per_minute: float,
+        *,
+        tick: float = 0.05,
+    ) -> None:
+        self.requests_per_minute = float(requests_per_minute)
+        self.tokens_per_minute = float(tokens_per_minute)
+        self.tick = tick
+
+        self._available_requests = self.requests_per_minute
+        self._available_tokens = self.tokens_per_minute
+        self._last_refill = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed_min = (now - self._last_refill) / 60.0
+        self._last_refill = now
+
+        self._available_requests = min(
+            self.requests_per_minute,
+            self._available_requests + elapsed_min * self.requests_per_minute,
+        )
+        self._available_tokens = min(
+            self.tokens_per_minute,
+            self._available_tokens + elapsed_min * self.tokens_per_minute,
+        )
+
+    async def acquire(self, n_requests: int = 1, n_tokens: int = 0) -> None:
+        # A call larger than a whole bucket could never fit; let it drain the bucket.
+        n_requests = min(n_requests, self.requests_per_minute)
+        n_tokens = min(n_tokens, self.tokens_per_minute)
+
+        # Waiters queue on the lock, so capacity is handed out in FIFO order.
+        async with self._lock:
+            while True:
+                self._refill()
+                if (
+                    self._available_requests >= n_requests
+                    and self._available_tokens >= n_tokens
+                ):
+                    self._available_requests -= n_requests
+                    self._available_tokens -= n_tokens
+                    return
+                await asyncio.sleep(self.tick)
+
+
+def _retry_after_seconds(exc: BaseException | None) -> float | None:
+    """Server-requested delay from an OpenAI/httpx error's response headers, if any."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    for header, scale in (("retry-after-ms", 1000.0), ("retry-after", 1.0)):
+        value = headers.get(header)
+        if value is None:
+            continue
+        try:
+            return float(value) / scale
+        except ValueError:
+            continue
+    return None
+
+
+def retry_delay(
+    attempt: int,
+    exc: BaseException | None = None,
+    *,
+    base: float = 1.0,
+    cap: float = 60.0,
+) -> float:
+    """
+    Seconds to wait before retry number `attempt` (0-based).
+
+    Honours the server's Retry-After when present; otherwise uses
+    exponential backoff with full jitter, so concurrent callers that failed
+    together do not retry together.
+    """
+    retry_after = _retry_after_seconds(exc)
+    if retry_after is not None:
+        return min(retry_after, cap)
+    return random.uniform(0.0, min(cap, base * 2 ** attempt))
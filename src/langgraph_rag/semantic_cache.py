@@ -0,0 +1,110 @@
+# src/langgraph_rag/semantic_cache.py
+
+from __future__ import annotations
+
+import copy
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, List, Optional, Tuple
+
+import numpy as np
+
+
+def _normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+class SemanticCache:
+    """
+    In-memory LRU cache for LLM agent outputs.
+
+    Entries live under a `namespace` (prompt id + model + any other inputs
+    the output depends on), so a prompt or model change never serves a stale
+    answer. Lookups match in two stages:
+
+      1) exact: SHA256 of (namespace, case/whitespace-normalised query)
+      2) semantic (only if `embed_fn` is set): the most similar cached query
+         in the same namespace, if its cosine similarity >= `threshold`
+
+    Values are deep-copied on the way in and out, so callers may mutate them.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 256,
+        *,
+        embed_fn: Optional[Callable[[str], List[float]]] = None,
+        threshold: float = 0.92,
+    ) -> None:
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self._embed_fn = embed_fn
+        # key -> (namespace, unit query vector or None, value)
+        self._entries: OrderedDict[str, Tuple[str, Optional[np.ndarray], Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(namespace: str, normalized_query: str) -> str:
+        return hashlib.sha256(f"{namespace}\x00{normalized_query}".encode("utf-8")).hexdigest()
+
+    def _embed(self, normalized_query: str) -> np.ndarray:
+        vec = np.asarray(self._embed_fn(normalized_query), dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def get(self, namespace: str, query: str) -> Any | None:
+        if self.maxsize <= 0:
+            return None
+
+        normalized = _normalize_query(query)
+        key = self._key(namespace, normalized)
+
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is not None:
+                self._entries.move_to_end(key)
+                return copy.deepcopy(hit[2])
+
+            if self._embed_fn is None:
+                return None
+            candidates = [
+                (k, vec) for k, (ns, vec, _) in self._entries.items()
+                if ns == namespace and vec is not None
+            ]
+
+        if not candidates:
+            return None
+
+        # Embedding is a network call; do it outside the lock.
+        query_vec = self._embed(normalized)
+        sims = np.stack([vec for _, vec in candidates]) @ query_vec
+        best = int(np.argmax(sims))
+        if sims[best] < self.threshold:
+            return None
+
+        best_key = candidates[best][0]
+        with self._lock:
+            hit = self._entries.get(best_key)
+            if hit is None:  # evicted meanwhile
+                return None
+            self._entries.move_to_end(best_key)
+            return copy.deepcopy(hit[2])
+
+    def put(self, namespace: str, query: str, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+
+        normalized = _normalize_query(query)
+        key = self._key(namespace, normalized)
+        vec = self._embed(normalized) if self._embed_fn is not None else None
+
+        with self._lock:
+            self._entries[key] = (namespace, vec, copy.deepcopy(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,38 @@
+# src/langgraph_rag/serialization.py
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import orjson
+
+# numpy scalars/arrays (cohort metrics) and non-string dict keys are
+# serialized natively; anything else orjson does not know falls back to str().
+_BASE_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def dumps(obj: Any, *, indent: bool = True, sort_keys: bool = False) -> str:
+    """JSON-encode `obj` with orjson (2-space indent by default)."""
+    option = _BASE_OPTIONS
+    if indent:
+        option |= orjson.OPT_INDENT_2
+    if sort_keys:
+        option |= orjson.OPT_SORT_KEYS
+    return orjson.dumps(obj, default=str, option=option).decode("utf-8")
+
+
+def loads(text: str | bytes) -> Any:
+    """Parse JSON text; raises orjson.JSONDecodeError (a ValueError) on bad input."""
+    return orjson.loads(text)
+
+
+@dataclass(frozen=True)
+class SerializedArtifacts:
+    """
+    JSON text of the agent outputs, encoded once when each output is
+    produced and reused by later prompts and by MLflow logging.
+    """
+    oncologist_view_json: Optional[str] = None
+    plan_json: Optional[str] = None
+    execution_result_json: Optional[str] = None
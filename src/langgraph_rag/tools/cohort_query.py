@@ -2,56 +2,235 @@
 
 from __future__ import annotations
 
+import os
+import weakref
 from functools import lru_cache
 from typing import Dict, Any, List, Tuple
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
 
 from langgraph_rag.config import IngestionConfig
 
 
+def _read_tsv(path: str) -> pa.Table:
+    return pacsv.read_csv(
+        path,
+        parse_options=pacsv.ParseOptions(delimiter="\t"),
+        # Empty fields are missing values, as with pd.read_csv.
+        convert_options=pacsv.ConvertOptions(strings_can_be_null=True),
+    )
+
+
+def _read_via_parquet(path: str) -> pa.Table:
+    """
+    Read the Parquet copy kept next to the TSV (<path>.parquet), writing it
+    first if it is missing or older than the TSV. The copy is memory-mapped,
+    so restarts skip the CSV parse and worker processes share its pages
+    through the OS page cache.
+    """
+    parquet_path = path + ".parquet"
+    if (
+        not os.path.exists(parquet_path)
+        or os.path.getmtime(parquet_path) < os.path.getmtime(path)
+    ):
+        # Write to a temp name and rename, so concurrent readers never see
+        # a partially written file.
+        tmp_path = f"{parquet_path}.{os.getpid()}.tmp"
+        try:
+            pq.write_table(_read_tsv(path), tmp_path, compression="zstd")
+            os.replace(tmp_path, parquet_path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    return pq.read_table(parquet_path, memory_map=True)
+
+
 @lru_cache(maxsize=16)
-def _load_table(path: str) -> pd.DataFrame:
-    """Load a TSV file once and cache it."""
-    return pd.read_csv(path, sep="\t")
+def _load_table(path: str, mtime: float | None = None) -> pd.DataFrame:
+    """
+    Load a TSV file once and cache it (mtime only takes part in the cache key).
+
+    Parsed with Arrow's multi-threaded CSV reader (via the Parquet cache when
+    the data directory is writable); columns stay Arrow-backed (pd.ArrowDtype)
+    instead of being converted to Python objects.
+    """
+    try:
+        table = _read_via_parquet(path)
+    except OSError:
+        # e.g. read-only data directory: parse the TSV directly.
+        table = _read_tsv(path)
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+
+# (name, path, mtime, id_column) for every table in a config
+_TablesKey = Tuple[Tuple[str, str, float, str], ...]
+
+
+def _tables_cache_key(config: IngestionConfig) -> _TablesKey:
+    return tuple(
+        (t.name, t.path, os.path.getmtime(t.path), t.id_column)
+        for t in config.tables
+    )
+
+
+@lru_cache(maxsize=4)
+def _cached_tables(config_key: _TablesKey) -> Dict[str, pd.DataFrame]:
+    return {
+        name: _load_table(path, mtime)
+        for name, path, mtime, _ in config_key
+    }
 
 
 def load_tables_from_config(config: IngestionConfig) -> Dict[str, pd.DataFrame]:
     """
     Load all tables defined in the ingestion config.
     Returns a mapping: table_name -> DataFrame
+
+    Tables are parsed once per process and re-read only when a TSV's
+    modification time changes.
+    """
+    return dict(_cached_tables(_tables_cache_key(config)))
+
+
+def load_available_tables(config: IngestionConfig) -> Dict[str, pd.DataFrame]:
+    """
+    Like load_tables_from_config, but skips tables whose TSV is missing
+    instead of failing, so one absent file only affects analyses that use
+    it. Each table is loaded (and cached) on its own.
     """
     tables: Dict[str, pd.DataFrame] = {}
     for t in config.tables:
-        tables[t.name] = _load_table(t.path)
+        try:
+            mtime = os.path.getmtime(t.path)
+        except FileNotFoundError:
+            continue
+        tables[t.name] = _load_table(t.path, mtime)
     return tables
 
 
+# Lowercased string view of each filtered column, keyed by (id(owner), col)
+# where owner is the column's Arrow array (see _cache_owner). Entries are
+# dropped when their owner is garbage-collected, so a recycled id() can
+# never pick up another column's values.
+_LOWER_CACHE: Dict[Tuple[int, str], pd.Series] = {}
+# For low-cardinality columns: lowercased value -> row positions holding it.
+_EXACT_INDEX: Dict[Tuple[int, str], Dict[str, np.ndarray]] = {}
+_TRACKED_OWNERS: set[int] = set()
+
+
+def _forget_owner(owner_id: int) -> None:
+    _TRACKED_OWNERS.discard(owner_id)
+    for cache in (_LOWER_CACHE, _EXACT_INDEX):
+        for key in [k for k in cache if k[0] == owner_id]:
+            cache.pop(key, None)
+
+
+def _cache_owner(df: pd.DataFrame, col: str) -> Any:
+    """
+    Object whose lifetime and identity key the cached views of df[col].
+
+    Arrow arrays are immutable, and copies of a frame (such as the Analyst's
+    per-query copies of the cached tables) share them until the column is
+    modified, which swaps in a new array. Keying on the array lets every copy
+    reuse the work done for the cached table. Other columns are keyed on
+    their frame.
+    """
+    values = df[col].array
+    if isinstance(values, pd.arrays.ArrowExtensionArray):
+        return values.__arrow_array__()
+    return df
+
+
+def _cache_key(df: pd.DataFrame, col: str) -> Tuple[int, str]:
+    owner = _cache_owner(df, col)
+    if id(owner) not in _TRACKED_OWNERS:
+        _TRACKED_OWNERS.add(id(owner))
+        weakref.finalize(owner, _forget_owner, id(owner))
+    return id(owner), col
+
+
+def _lowered_column(df: pd.DataFrame, col: str) -> pd.Series:
+    key = _cache_key(df, col)
+    lower = _LOWER_CACHE.get(key)
+    if lower is None:
+        lower = df[col].astype("string[pyarrow]").str.lower()
+        # Low-cardinality columns become categoricals, so string matching
+        # runs once per distinct value rather than once per row.
+        if lower.nunique(dropna=True) <= len(lower) // 2:
+            lower = lower.astype("category")
+        _LOWER_CACHE[key] = lower
+    return lower
+
+
+def _value_index(df: pd.DataFrame, col: str) -> Dict[str, np.ndarray] | None:
+    """Hash index of a categorical (low-cardinality) column; None otherwise."""
+    key = _cache_key(df, col)
+    index = _EXACT_INDEX.get(key)
+    if index is None:
+        lower = _lowered_column(df, col)
+        if not isinstance(lower.dtype, pd.CategoricalDtype):
+            return None
+        index = lower.groupby(lower, sort=False, observed=True).indices
+        _EXACT_INDEX[key] = index
+    return index
+
+
+def _rows_mask(n_rows: int, index: Dict[str, np.ndarray], keys: List[str]) -> np.ndarray:
+    mask = np.zeros(n_rows, dtype=bool)
+    for k in keys:
+        mask[index[k]] = True
+    return mask
+
+
+def _column_mask(df: pd.DataFrame, col: str, val: Any) -> np.ndarray:
+    """Boolean row mask for one filter_spec entry (column must exist)."""
+    index = _value_index(df, col)
+    if index is not None:
+        # Match against the distinct values only, then mark their rows.
+        if isinstance(val, list):
+            needles = {str(v).lower() for v in val}
+            keys = [k for k in index if k in needles]
+        else:
+            needle = str(val).lower()
+            keys = [k for k in index if needle in k]
+        return _rows_mask(len(df), index, keys)
+
+    lower = _lowered_column(df, col)
+    if isinstance(val, list):
+        return lower.isin([str(v).lower() for v in val]).to_numpy(dtype=bool)
+    return lower.str.contains(str(val).lower(), regex=False, na=False).to_numpy(dtype=bool)
+
+
 def _apply_filter(df: pd.DataFrame, filter_spec: Dict[str, Any]) -> pd.DataFrame:
     """
     Apply a simple AND filter over columns.
 
-    For each key, value in filter_spec:
+    For each key, value in filter_spec (both compared case-insensitively):
       - if value is a list: df[col].isin(value)
-      - else: case-insensitive substring match on df[col].astype(str)
+      - else: substring match on df[col]
     """
     if not filter_spec:
         return df
 
-    mask = pd.Series(True, index=df.index)
+    masks: List[np.ndarray] = []
     for col, val in filter_spec.items():
         if col not in df.columns:
             # Column missing: drop everything for this filter
-            mask &= False
-            continue
+            return df.iloc[0:0]
 
-        series = df[col].astype(str)
-        if isinstance(val, list):
-            mask &= series.isin([str(v) for v in val])
-        else:
-            mask &= series.str.contains(str(val), case=False, na=False)
+        mask = _column_mask(df, col, val)
+        if not mask.any():
+            # Nothing can survive the AND; skip the remaining columns.
+            return df.iloc[0:0]
+        masks.append(mask)
 
-    return df[mask]
+    return df.iloc[np.logical_and.reduce(masks)]
 
 
 def execute_cohort_filter_step(
@@ -170,9 +349,11 @@ def execute_feature_descriptives_step(
             "error": f"No numeric values available for feature: {feature}",
         }, context
 
-    desc = series.describe()  # count, mean, std, min, 25%, 50%, 75%, max
-    q1 = float(desc["25%"])
-    q3 = float(desc["75%"])
+    # One pass per statistic over a plain float array (describe() builds an
+    # intermediate Series and sorts once per quantile).
+    arr = series.to_numpy(dtype=np.float64)
+    n = arr.size
+    q1, median, q3 = np.percentile(arr, [25, 50, 75])
 
     result: Dict[str, Any] = {
         "step_id": step.get("step_id"),
@@ -182,13 +363,13 @@ def execute_feature_descriptives_step(
         "source": source,
         "feature": feature,
         "metrics": {
-            "count": int(desc["count"]),
-            "mean": float(desc["mean"]),
-            "std": float(desc["std"]) if not pd.isna(desc["std"]) else None,
-            "min": float(desc["min"]),
-            "max": float(desc["max"]),
-            "median": float(desc["50%"]),
-            "iqr": [q1, q3],
+            "count": int(n),
+            "mean": float(arr.mean()),
+            "std": float(arr.std(ddof=1)) if n > 1 else None,
+            "min": float(arr.min()),
+            "max": float(arr.max()),
+            "median": float(median),
+            "iqr": [float(q1), float(q3)],
         },
     }
     return result, context
@@ -0,0 +1,128 @@
+# src/langgraph_rag/tools/plan_executor.py
+
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+
+from langgraph_rag.config import IngestionConfig
+from langgraph_rag.tools.cohort_query import (
+    execute_cohort_filter_step,
+    execute_feature_descriptives_step,
+)
+from langgraph_rag.tools.vector_search import vector_search_patients_batch
+
+MAX_PARALLEL_STEPS = 8
+
+
+def _step_header(step: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "step_id": step.get("step_id"),
+        "name": step.get("name"),
+        "tool": step.get("tool"),
+    }
+
+
+def _run_descriptives(
+    steps: List[Dict[str, Any]],
+    tables: Dict[str, pd.DataFrame],
+    context: Dict[str, Any],
+) -> List[Dict[str, Any]]:
+    """
+    Descriptives steps only read the current cohort, so a run of them is
+    independent: compute them on a thread pool (numpy releases the GIL).
+    """
+    if len(steps) == 1:
+        return [execute_feature_descriptives_step(steps[0], tables, context)[0]]
+
+    with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_STEPS, len(steps))) as executor:
+        return list(
+            executor.map(
+                lambda step: execute_feature_descriptives_step(step, tables, context)[0],
+                steps,
+            )
+        )
+
+
+def _run_vector_searches(
+    steps: List[Dict[str, Any]],
+    config: Optional[IngestionConfig],
+    user_query: str,
+) -> List[Dict[str, Any]]:
+    """Run a group of vector_search steps as one batched Chroma query."""
+    if config is None:
+        return [
+            {**_step_header(step), "status": "failed", "error": "vector_search needs an ingestion config"}
+            for step in steps
+        ]
+
+    queries = [step.get("query") or user_query for step in steps]
+    try:
+        hits_per_query = vector_search_patients_batch(config, queries, k=5)
+    except Exception as e:
+        return [{**_step_header(step), "status": "failed", "error": str(e)} for step in steps]
+
+    return [
+        {**_step_header(step), "status": "success", "query": query, "results": hits}
+        for step, query, hits in zip(steps, queries, hits_per_query)
+    ]
+
+
+def execute_plan(
+    plan: Dict[str, Any],
+    tables: Dict[str, pd.DataFrame],
+    *,
+    config: Optional[IngestionConfig] = None,
+    user_query: str = "",
+) -> Dict[str, Any]:
+    """
+    Execute plan["execution_plan"] with the built-in tools and return an
+    execution_result ({"steps": [...], "overall_status": ...}).
+
+    Steps run in plan order, except that consecutive steps of the same
+    parallelisable tool are grouped: feature_descriptives steps over the
+    same cohort run concurrently, and vector_search steps share one batched
+    query. cohort_sql steps change the cohort, so they always run alone.
+    """
+    steps: List[Dict[str, Any]] = plan.get("execution_plan") or []
+    context: Dict[str, Any] = {}
+    results: List[Dict[str, Any]] = []
+
+    group_runners: Dict[str, Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]]] = {
+        "feature_descriptives": lambda group: _run_descriptives(group, tables, context),
+        "vector_search": lambda group: _run_vector_searches(group, config, user_query),
+    }
+
+    i = 0
+    while i < len(steps):
+        step = steps[i]
+        tool = step.get("tool")
+
+        if tool in group_runners:
+            j = i
+            while j < len(steps) and steps[j].get("tool") == tool:
+                j += 1
+            results.extend(group_runners[tool](steps[i:j]))
+            i = j
+            continue
+
+        if tool == "cohort_sql":
+            step_result, context = execute_cohort_filter_step(step, tables, context)
+        elif tool in (None, "none"):
+            step_result = {**_step_header(step), "status": "skipped"}
+        else:
+            step_result = {**_step_header(step), "status": "failed", "error": f"Unknown tool: {tool}"}
+        results.append(step_result)
+        i += 1
+
+    statuses = [r["status"] for r in results if r["status"] != "skipped"]
+    if not statuses or all(s == "success" for s in statuses):
+        overall_status = "success"
+    elif any(s == "success" for s in statuses):
+        overall_status = "partial_success"
+    else:
+        overall_status = "failed"
+
+    return {"steps": results, "overall_status": overall_status}
@@ -2,11 +2,16 @@
 
 from __future__ import annotations
 
-from typing import List, Dict
+from typing import Any, List, Dict, Tuple
 
 from langgraph_rag.config import IngestionConfig, TableConfig
+from langgraph_rag.embeddings import embed_texts, l2_normalize
 from langgraph_rag.vectorstore import get_or_create_chroma_collection
 
+# (embedding model + dimensions, query) -> query embedding; oldest entries are evicted first
+_QUERY_EMB_CACHE: Dict[Tuple[Tuple[str, Any], str], List[float]] = {}
+_QUERY_EMB_CACHE_SIZE = 1024
+
 
 def get_default_ingestion_config() -> IngestionConfig:
     """
@@ -34,41 +39,83 @@ def get_patient_collection(config: IngestionConfig):
     """
     Open existing Chroma collection (must be already built).
     Does NOT rebuild or reset.
+
+    The handle is opened once per process (see
+    get_or_create_chroma_collection) and reused by later searches.
     """
-    collection = get_or_create_chroma_collection(config)
-    return collection
+    return get_or_create_chroma_collection(config)
 
 
-def vector_search_patients(
+def _embed_queries(config: IngestionConfig, queries: List[str]) -> List[List[float]]:
+    """
+    Embed queries with the collection's model, reusing cached vectors for
+    repeats. Queries stay in this in-memory cache only; they never go to the
+    on-disk ingestion cache of get_text_embedder.
+    """
+    model = (config.embedding_model, config.embedding_dimensions)
+    missing = list(dict.fromkeys(q for q in queries if (model, q) not in _QUERY_EMB_CACHE))
+
+    if missing:
+        vectors = embed_texts(
+            missing, model=config.embedding_model, dimensions=config.embedding_dimensions
+        )
+        if config.normalize_embeddings:
+            # Match the stored vectors (see get_text_embedder).
+            vectors = l2_normalize(vectors)
+        for q, vec in zip(missing, vectors):
+            _QUERY_EMB_CACHE[(model, q)] = [float(x) for x in vec]
+
+    embeddings = [_QUERY_EMB_CACHE[(model, q)] for q in queries]
+    while len(_QUERY_EMB_CACHE) > _QUERY_EMB_CACHE_SIZE:
+        _QUERY_EMB_CACHE.pop(next(iter(_QUERY_EMB_CACHE)))
+    return embeddings
+
+
+def vector_search_patients_batch(
     config: IngestionConfig,
-    query: str,
+    queries: List[str],
     k: int = 5,
-) -> List[Dict]:
+) -> List[List[Dict]]:
     """
-    Query the Chroma collection for top-k relevant chunks.
-    Returns a list of JSON-serializable dicts with snippet and metadata.
+    Run several searches in one Chroma query (one embedding request for all
+    new queries, one index call). Returns one result list per query, in the
+    same shape and order as vector_search_patients.
     """
+    if not queries:
+        return []
+
     collection = get_patient_collection(config)
 
     res = collection.query(
-        query_texts=[query],
+        query_embeddings=_embed_queries(config, queries),
         n_results=k,
         include=["documents", "metadatas", "distances"],
     )
 
-    docs = res["documents"][0]
-    metas = res["metadatas"][0]
-    dists = res["distances"][0]
-
-    results: List[Dict] = []
-    for doc, meta, dist in zip(docs, metas, dists):
-        results.append(
-            {
-                "id": meta.get("row_id") or meta.get("patient_id") or "UNKNOWN",
-                "snippet": doc,
-                "metadata": meta,
-                "distance": float(dist),
-            }
+    batch_results: List[List[Dict]] = []
+    for docs, metas, dists in zip(res["documents"], res["metadatas"], res["distances"]):
+        batch_results.append(
+            [
+                {
+                    "id": meta.get("row_id") or meta.get("patient_id") or "UNKNOWN",
+                    "snippet": doc,
+                    "metadata": meta,
+                    "distance": float(dist),
+                }
+                for doc, meta, dist in zip(docs, metas, dists)
+            ]
         )
 
-    return results
+    return batch_results
+
+
+def vector_search_patients(
+    config: IngestionConfig,
+    query: str,
+    k: int = 5,
+) -> List[Dict]:
+    """
+    Query the Chroma collection for top-k relevant chunks.
+    Returns a list of JSON-serializable dicts with snippet and metadata.
+    """
+    return vector_search_patients_batch(config, [query], k=k)[0]
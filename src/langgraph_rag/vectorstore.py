@@ -2,98 +2,588 @@
 
 from __future__ import annotations
 
+import asyncio
+import logging
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
 from pathlib import Path
-from typing import List
-
-import os
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import chromadb
+from chromadb.api.models.AsyncCollection import AsyncCollection
 from chromadb.config import Settings
 from chromadb.utils import embedding_functions  # <-- important
-from dotenv import load_dotenv
 
 from .config import IngestionConfig
-from .chunking import DocChunk, build_chunked_documents
+from .chunking import DocChunk, get_token_encoder, iter_chunked_documents
+from .embeddings import (
+    MAX_INPUTS_PER_REQUEST,
+    MAX_TOKENS_PER_REQUEST,
+    OPENAI_RPM,
+    OPENAI_TPM,
+    get_text_embedder,
+    request_throttle,
+)
+from .openai_clients import get_openai_api_key
+from .ratelimit import AsyncRateLimiter
 
-# Make sure environment variables from .env are loaded (OPENAI_API_KEY)
-load_dotenv()
+logger = logging.getLogger(__name__)
 
 
 # ---------- Embedding function (OpenAI via Chroma helper) ----------
 
+@lru_cache(maxsize=8)
+def _embedding_function(model: str, dimensions: Optional[int]):
+    # Chroma's built-in OpenAIEmbeddingFunction
+    return embedding_functions.OpenAIEmbeddingFunction(
+        api_key=get_openai_api_key(),
+        model_name=model,
+        dimensions=dimensions,
+    )
+
+
 def get_embedding_function(config: IngestionConfig):
     """
     Returns a Chroma-compatible embedding function object.
     This object has __call__ + name(), which Chroma 2.x expects.
-    """
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise RuntimeError(
-            "OPENAI_API_KEY is not set. "
-            "Set it in your environment or .env file."
-        )
 
-    # Chroma's built-in OpenAIEmbeddingFunction
-    return embedding_functions.OpenAIEmbeddingFunction(
-        api_key=api_key,
-        model_name=config.embedding_model,
-    )
+    Built once per (model, dimensions) and reused.
+    """
+    return _embedding_function(config.embedding_model, config.embedding_dimensions)
 
 
 # ---------- Chroma client + collection ----------
 
-def get_or_create_chroma_collection(config: IngestionConfig) -> chromadb.api.models.Collection.Collection:
+def _enable_wal(sqlite_path: Path) -> None:
     """
-    Returns a persistent Chroma collection for this project.
+    Put Chroma's SQLite file in WAL mode. The journal mode is stored in the
+    database file, so setting it once from our own connection also applies
+    to Chroma's connections.
     """
-    persist_dir = Path(config.persist_dir)
-    persist_dir.mkdir(parents=True, exist_ok=True)
+    if not sqlite_path.exists():
+        return
+    conn = sqlite3.connect(str(sqlite_path), timeout=30)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+    finally:
+        conn.close()
 
-    embedding_fn = get_embedding_function(config)
 
-    client = chromadb.PersistentClient(
-        path=str(persist_dir),
-        settings=Settings(allow_reset=False),
+def _hnsw_configuration(config: IngestionConfig) -> Tuple[Tuple[str, Any], ...]:
+    # A tuple (not a dict) so it can be part of the collection cache key.
+    return (
+        ("space", config.distance),
+        ("ef_construction", config.hnsw_construction_ef),
+        ("max_neighbors", config.hnsw_m),
+        ("sync_threshold", config.hnsw_sync_threshold),
+        ("batch_size", config.hnsw_batch_size),
     )
 
-    collection = client.get_or_create_collection(
-        name=config.collection_name,
+
+@lru_cache(maxsize=8)
+def _get_collection_cached(
+    persist_dir: str,
+    chroma_host: Optional[str],
+    chroma_port: int,
+    collection_name: str,
+    embedding_model: str,
+    embedding_dimensions: Optional[int],
+    fast_ingest: bool,
+    hnsw: Tuple[Tuple[str, Any], ...],
+    pre_embed: bool = False,
+) -> chromadb.api.models.Collection.Collection:
+    embedding_fn = None if pre_embed else _embedding_function(embedding_model, embedding_dimensions)
+
+    if chroma_host:
+        client = chromadb.HttpClient(host=chroma_host, port=chroma_port)
+    else:
+        path = Path(persist_dir)
+        path.mkdir(parents=True, exist_ok=True)
+        client = chromadb.PersistentClient(
+            path=str(path),
+            settings=Settings(allow_reset=False),
+        )
+        if fast_ingest:
+            _enable_wal(path / "chroma.sqlite3")
+
+    return client.get_or_create_collection(
+        name=collection_name,
         embedding_function=embedding_fn,
+        configuration={"hnsw": dict(hnsw)},
     )
 
-    return collection
+
+def get_or_create_chroma_collection(
+    config: IngestionConfig,
+    *,
+    pre_embed: bool = False,
+) -> chromadb.api.models.Collection.Collection:
+    """
+    Returns a persistent Chroma collection for this project: on the Chroma
+    server at config.chroma_host if set, else in config.persist_dir.
+
+    The collection keeps the Chroma embedding function for query_texts;
+    ingestion passes precomputed embeddings (see embeddings.embed_texts).
+
+    With `pre_embed`, the handle has no embedding function attached, for
+    ingestion that always passes precomputed embeddings: Chroma then never
+    builds or calls the OpenAI embedding function on add. Queries use a
+    handle without pre_embed (same collection), so query_texts still works.
+
+    The client and collection are opened once per process for each
+    store/collection/model combination and reused by later calls.
+    """
+    return _get_collection_cached(
+        str(config.persist_dir),
+        config.chroma_host,
+        config.chroma_port,
+        config.collection_name,
+        config.embedding_model,
+        config.embedding_dimensions,
+        config.fast_ingest,
+        _hnsw_configuration(config),
+        pre_embed,
+    )
+
+
+async def get_or_create_chroma_collection_async(
+    config: IngestionConfig,
+    *,
+    pre_embed: bool = False,
+):
+    """
+    Async variant of get_or_create_chroma_collection. With config.chroma_host
+    set this returns an AsyncCollection on the Chroma server (writes from
+    index_chunks_async are then awaited directly, and several ingestion
+    processes can write at once); otherwise it opens the embedded store.
+    """
+    if not config.chroma_host:
+        return await asyncio.to_thread(
+            get_or_create_chroma_collection, config, pre_embed=pre_embed
+        )
+
+    client = await chromadb.AsyncHttpClient(host=config.chroma_host, port=config.chroma_port)
+    return await client.get_or_create_collection(
+        name=config.collection_name,
+        embedding_function=None if pre_embed else get_embedding_function(config),
+        configuration={"hnsw": dict(_hnsw_configuration(config))},
+    )
+
+
+def tune_collection_for_queries(
+    collection: chromadb.api.models.Collection.Collection,
+    config: IngestionConfig,
+) -> None:
+    """Apply config.hnsw_search_ef (if set) once ingestion is done."""
+    if config.hnsw_search_ef:
+        collection.modify(configuration={"hnsw": {"ef_search": config.hnsw_search_ef}})
 
 
 # ---------- Index chunks ----------
 
-def index_chunks(
-    chunks: List[DocChunk],
+def _embed_deduplicated(
+    texts: List[str],
+    embedding_fn,
+    token_counts: Optional[List[int]] = None,
+) -> tuple[List[Any], int]:
+    """
+    Returns one embedding per text, calling embedding_fn once per distinct
+    text in the batch, plus the number of distinct texts. Repeats across
+    batches and runs are served by the embedder's own cache (see
+    embeddings.get_text_embedder).
+
+    The embedder from get_text_embedder also gets the texts' known token
+    counts, so charging its request throttle needs no second tokenization.
+    """
+    uniq: Dict[str, int] = {}
+    order = [uniq.setdefault(t, len(uniq)) for t in texts]
+    kwargs: Dict[str, Any] = {}
+    if token_counts is not None and getattr(embedding_fn, "throttles_requests", False):
+        counts = [0] * len(uniq)
+        for i, n in zip(order, token_counts):
+            counts[i] = n
+        kwargs["token_counts"] = counts
+    if len(uniq) == len(texts):
+        return embedding_fn(texts, **kwargs), len(uniq)
+    vectors = embedding_fn(list(uniq), **kwargs)
+    return [vectors[i] for i in order], len(uniq)
+
+
+def _chunk_tokens(chunk: DocChunk) -> int:
+    # The chunker records each chunk's token count; only count chunks built elsewhere.
+    return chunk.n_tokens or len(get_token_encoder().encode_ordinary(chunk.text))
+
+
+@dataclass
+class _ChunkBatch:
+    """
+    One packed batch in column form: the lists collection.add takes are
+    filled while packing, so nothing walks the chunks again to build them.
+    """
+    ids: List[str] = field(default_factory=list)
+    texts: List[str] = field(default_factory=list)
+    metadatas: List[Dict[str, Any]] = field(default_factory=list)
+    token_counts: List[int] = field(default_factory=list)
+    n_tokens: int = 0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def append(self, chunk: DocChunk, n_tokens: int) -> None:
+        self.ids.append(chunk.id)
+        self.texts.append(chunk.text)
+        self.metadatas.append(chunk.metadata)
+        self.token_counts.append(n_tokens)
+        self.n_tokens += n_tokens
+
+    def without(self, drop: set[str]) -> "_ChunkBatch":
+        keep = [i for i, chunk_id in enumerate(self.ids) if chunk_id not in drop]
+        token_counts = [self.token_counts[i] for i in keep]
+        return _ChunkBatch(
+            ids=[self.ids[i] for i in keep],
+            texts=[self.texts[i] for i in keep],
+            metadatas=[self.metadatas[i] for i in keep],
+            token_counts=token_counts,
+            n_tokens=sum(token_counts),
+        )
+
+
+def _pack_batches(
+    chunks: Iterable[DocChunk],
+    *,
+    max_items: int,
+    max_tokens: int,
+) -> Iterator[_ChunkBatch]:
+    """
+    Greedily packs chunks into batches of at most max_items chunks and
+    max_tokens tokens, so each embedding request carries as much as the
+    API allows. A single chunk over max_tokens gets a batch of its own.
+    """
+    batch = _ChunkBatch()
+    for chunk in chunks:
+        n = _chunk_tokens(chunk)
+        if batch and (len(batch) >= max_items or batch.n_tokens + n > max_tokens):
+            yield batch
+            batch = _ChunkBatch()
+        batch.append(chunk, n)
+    if batch:
+        yield batch
+
+
+# Ids per collection.get when checking which chunks are already indexed.
+_EXISTING_IDS_LOOKUP = 1000
+
+
+def _split_indexed(
+    ids: List[str],
+    texts: List[str],
+    found: Dict[str, Any],
+) -> tuple[set[str], int]:
+    """
+    From collection.get results for `ids`: the ids stored with the
+    same text (safe to skip), and how many are stored with a different text.
+    Chunk ids are positional, so an edited row keeps its id.
+    """
+    stored = dict(zip(found["ids"], found["documents"]))
+    unchanged: set[str] = set()
+    n_stale = 0
+    for chunk_id, text in zip(ids, texts):
+        if chunk_id in stored:
+            if stored[chunk_id] == text:
+                unchanged.add(chunk_id)
+            else:
+                n_stale += 1
+    return unchanged, n_stale
+
+
+def _indexed_ids(
+    collection: chromadb.api.models.Collection.Collection,
+    batch: _ChunkBatch,
+) -> tuple[set[str], int]:
+    unchanged: set[str] = set()
+    n_stale = 0
+    for start in range(0, len(batch), _EXISTING_IDS_LOOKUP):
+        ids = batch.ids[start:start + _EXISTING_IDS_LOOKUP]
+        texts = batch.texts[start:start + _EXISTING_IDS_LOOKUP]
+        found = collection.get(ids=ids, include=["documents"])
+        part_unchanged, part_stale = _split_indexed(ids, texts, found)
+        unchanged |= part_unchanged
+        n_stale += part_stale
+    return unchanged, n_stale
+
+
+async def _indexed_ids_async(
+    collection: AsyncCollection,
+    batch: _ChunkBatch,
+) -> tuple[set[str], int]:
+    unchanged: set[str] = set()
+    n_stale = 0
+    for start in range(0, len(batch), _EXISTING_IDS_LOOKUP):
+        ids = batch.ids[start:start + _EXISTING_IDS_LOOKUP]
+        texts = batch.texts[start:start + _EXISTING_IDS_LOOKUP]
+        found = await collection.get(ids=ids, include=["documents"])
+        part_unchanged, part_stale = _split_indexed(ids, texts, found)
+        unchanged |= part_unchanged
+        n_stale += part_stale
+    return unchanged, n_stale
+
+
+def _log_stale(n_stale: int) -> None:
+    logger.warning(
+        "Replacing %d indexed chunks whose text changed since they were added", n_stale
+    )
+
+
+def _add_batch(
+    batch: _ChunkBatch,
     collection: chromadb.api.models.Collection.Collection,
-    batch_size: int = 100,  # you can tune this
+    *,
+    embedding_fn,
+    skip_existing: bool = False,
+    upsert: bool = False,
+) -> tuple[int, int]:
+    """Embeds and adds (or upserts) one batch; returns (texts embedded, distinct texts)."""
+    if skip_existing:
+        unchanged, n_stale = _indexed_ids(collection, batch)
+        if unchanged:
+            batch = batch.without(unchanged)
+            if not batch:
+                return 0, 0
+        if n_stale:
+            # add() would keep the old rows for these ids.
+            _log_stale(n_stale)
+            upsert = True
+    write = collection.upsert if upsert else collection.add
+
+    if embedding_fn is None:
+        write(
+            ids=batch.ids,
+            documents=batch.texts,
+            metadatas=batch.metadatas,
+        )
+        return 0, 0
+
+    embeddings, n_unique = _embed_deduplicated(batch.texts, embedding_fn, batch.token_counts)
+    write(
+        ids=batch.ids,
+        documents=batch.texts,
+        metadatas=batch.metadatas,
+        embeddings=embeddings,
+    )
+    return len(batch), n_unique
+
+
+async def _add_batch_async(
+    batch: _ChunkBatch,
+    collection: AsyncCollection,
+    *,
+    embedding_fn,
+    skip_existing: bool = False,
+    upsert: bool = False,
+) -> tuple[int, int]:
+    """_add_batch for a Chroma server collection: only embedding runs on a thread."""
+    if skip_existing:
+        unchanged, n_stale = await _indexed_ids_async(collection, batch)
+        if unchanged:
+            batch = batch.without(unchanged)
+            if not batch:
+                return 0, 0
+        if n_stale:
+            _log_stale(n_stale)
+            upsert = True
+    write = collection.upsert if upsert else collection.add
+
+    embeddings, n_embedded, n_unique = None, 0, 0
+    if embedding_fn is not None:
+        embeddings, n_unique = await asyncio.to_thread(
+            _embed_deduplicated, batch.texts, embedding_fn, batch.token_counts
+        )
+        n_embedded = len(batch)
+
+    await write(
+        ids=batch.ids,
+        documents=batch.texts,
+        metadatas=batch.metadatas,
+        embeddings=embeddings,
+    )
+    return n_embedded, n_unique
+
+
+async def index_chunks_async(
+    chunks: Iterable[DocChunk],
+    collection: chromadb.api.models.Collection.Collection | AsyncCollection,
+    batch_size: int = 1000,
+    *,
+    embedding_fn=None,
+    max_in_flight: int = 5,
+    max_batch_tokens: int = MAX_TOKENS_PER_REQUEST,
+    rate_limiter: AsyncRateLimiter | None = None,
+    skip_existing: bool = False,
+    upsert: bool = False,
 ) -> None:
     """
-    Adds chunks to the given Chroma collection in batches, so we don't exceed
-    OpenAI's max tokens per request.
+    Adds chunks to the given Chroma collection in batches of up to
+    `batch_size` chunks / `max_batch_tokens` tokens, with up to
+    `max_in_flight` batches being embedded/added at once (each on a worker
+    thread), so the embedding round-trips overlap instead of queueing.
+
+    `collection` may also be an AsyncCollection from
+    get_or_create_chroma_collection_async; its reads and writes are awaited
+    directly and only embedding runs on a worker thread.
+
+    A new batch is only read from `chunks` once a slot is free, so at most
+    `max_in_flight` batches are held in memory. `chunks` is consumed on a
+    worker thread, so a lazy producer such as iter_chunked_documents chunks
+    the next rows while earlier batches are being embedded. If any batch fails, no new
+    batches are started and the first error is raised once the in-flight
+    ones have finished.
+
+    Embedding requests take their requests and tokens from `rate_limiter`
+    (by default one limiter over OPENAI_RPM / OPENAI_TPM, shared by all
+    batches of this call), so concurrent batches stay under the account's
+    quota instead of tripping 429s and backing off. With the embedder from
+    get_text_embedder only the texts actually sent to the API are charged
+    (not chunks skipped as existing or served from its cache); any other
+    embedding function is charged for the whole batch before it runs.
+
+    With `skip_existing`, chunks already stored under their id with the same
+    text are dropped before embedding (checked with batched collection.get
+    calls); ids stored with a different text are re-embedded and upserted,
+    with a warning, so edited rows never keep their old documents.
+    With `upsert`, batches are written with collection.upsert, so re-running
+    an ingestion replaces existing rows instead of failing on their ids.
+
+    Identical texts within a batch are embedded once; repeats across
+    batches are left to embedding_fn's cache.
     """
-    if not chunks:
-        return
+    semaphore = asyncio.Semaphore(max_in_flight)
+    tasks: List[asyncio.Task] = []
+    dedup = {"texts": 0, "unique": 0}
+    if rate_limiter is None:
+        rate_limiter = AsyncRateLimiter(OPENAI_RPM, OPENAI_TPM)
+
+    loop = asyncio.get_running_loop()
 
-    n = len(chunks)
-    for start in range(0, n, batch_size):
-        end = min(start + batch_size, n)
-        batch = chunks[start:end]
+    def throttle(n_requests: int, n_tokens: int) -> None:
+        # Called on embedding worker threads; the limiter lives on this loop.
+        asyncio.run_coroutine_threadsafe(
+            rate_limiter.acquire(n_requests=n_requests, n_tokens=n_tokens), loop
+        ).result()
 
-        ids = [c.id for c in batch]
-        texts = [c.text for c in batch]
-        metadatas = [c.metadata for c in batch]
+    async def run(batch: _ChunkBatch) -> None:
+        try:
+            if not getattr(embedding_fn, "throttles_requests", False):
+                # Chroma's or a caller's embedding function: charge the
+                # whole batch up front.
+                await rate_limiter.acquire(
+                    n_requests=-(-len(batch) // MAX_INPUTS_PER_REQUEST),
+                    n_tokens=batch.n_tokens,
+                )
+            with request_throttle(throttle):
+                if isinstance(collection, AsyncCollection):
+                    n_embedded, n_unique = await _add_batch_async(
+                        batch,
+                        collection,
+                        embedding_fn=embedding_fn,
+                        skip_existing=skip_existing,
+                        upsert=upsert,
+                    )
+                else:
+                    n_embedded, n_unique = await asyncio.to_thread(
+                        _add_batch,
+                        batch,
+                        collection,
+                        embedding_fn=embedding_fn,
+                        skip_existing=skip_existing,
+                        upsert=upsert,
+                    )
+            dedup["texts"] += n_embedded
+            dedup["unique"] += n_unique
+        finally:
+            semaphore.release()
 
-        collection.add(
-            ids=ids,
-            documents=texts,
-            metadatas=metadatas,
+    batches = _pack_batches(chunks, max_items=batch_size, max_tokens=max_batch_tokens)
+    while True:
+        await semaphore.acquire()
+        if any(t.done() and t.exception() is not None for t in tasks):
+            semaphore.release()
+            break
+        # Chunking (and packing) runs on a worker thread, so the event loop
+        # keeps dispatching batches and rate-limiter waits meanwhile.
+        batch = await asyncio.to_thread(next, batches, None)
+        if batch is None:
+            semaphore.release()
+            break
+        tasks.append(asyncio.create_task(run(batch)))
+
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+
+    if dedup["texts"]:
+        logger.info(
+            "Embedded %d chunks as %d distinct texts (%.1f%% in-batch duplicates)",
+            dedup["texts"],
+            dedup["unique"],
+            100.0 * (1 - dedup["unique"] / dedup["texts"]),
         )
 
 
+def index_chunks(
+    chunks: Iterable[DocChunk],
+    collection: chromadb.api.models.Collection.Collection,
+    batch_size: int = 1000,
+    *,
+    embedding_fn=None,
+    max_in_flight: int = 5,
+    max_batch_tokens: int = MAX_TOKENS_PER_REQUEST,
+    rate_limiter: AsyncRateLimiter | None = None,
+    skip_existing: bool = False,
+    upsert: bool = False,
+) -> None:
+    """
+    Adds chunks to the given Chroma collection in token-packed batches, so
+    each embedding request is as full as possible without exceeding
+    OpenAI's per-request input and token limits.
+
+    `chunks` may be any iterable (e.g. the iter_chunked_documents generator);
+    only the batches in flight are held in memory.
+
+    If `embedding_fn` is given, chunks are embedded here (see
+    embeddings.get_text_embedder, which caches vectors on disk); otherwise
+    Chroma embeds every document itself.
+
+    Synchronous wrapper around index_chunks_async; also callable from code
+    that already runs an event loop (notebooks), in which case the work runs
+    on a separate thread.
+    """
+    coro = index_chunks_async(
+        chunks,
+        collection,
+        batch_size,
+        embedding_fn=embedding_fn,
+        max_in_flight=max_in_flight,
+        max_batch_tokens=max_batch_tokens,
+        rate_limiter=rate_limiter,
+        skip_existing=skip_existing,
+        upsert=upsert,
+    )
+
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        asyncio.run(coro)
+        return
+
+    # Called from inside a running event loop (e.g. a Jupyter cell), where
+    # asyncio.run is not allowed: run the coroutine on its own loop in a
+    # worker thread and wait for it.
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        executor.submit(asyncio.run, coro).result()
+
 
 # ---------- High-level orchestration ----------
 
@@ -104,13 +594,21 @@ def build_persistent_vector_store(
 ) -> chromadb.api.models.Collection.Collection:
     """
     High-level helper:
-      - builds chunked docs (TSV + metadata)
+      - streams chunked docs (TSV + metadata)
       - opens Chroma persistent collection
-      - indexes chunks
+      - indexes chunks as they are produced (only the batches in flight are
+        held in memory)
 
     Returns the Chroma collection.
     """
-    chunks = build_chunked_documents(config)
+    index_chunks(
+        iter_chunked_documents(config),
+        get_or_create_chroma_collection(config, pre_embed=True),
+        config.ingest_batch_size,
+        embedding_fn=get_text_embedder(config),
+        skip_existing=config.skip_existing,
+        upsert=config.idempotent,
+    )
     collection = get_or_create_chroma_collection(config)
-    index_chunks(chunks, collection)
+    tune_collection_for_queries(collection, config)
     return collection
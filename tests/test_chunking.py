@@ -0,0 +1,77 @@
+import os
+import random
+import tempfile
+import unittest
+
+import pandas as pd
+
+from langgraph_rag.chunking import _load_table_rows_as_text
+from langgraph_rag.config import TableConfig
+
+
+def _baseline_rows(path, table_cfg):
+    """The original per-row formatter (df.iterrows), kept as the reference."""
+    df = pd.read_csv(path, sep="\t")
+    text_cols = table_cfg.text_columns or [c for c in df.columns if c != table_cfg.id_column]
+    rows = []
+    for _, row in df.iterrows():
+        parts = [f"{col}: {row[col]}" for col in text_cols if not pd.isna(row[col])]
+        rows.append((str(row[table_cfg.id_column]), "\n".join(parts)))
+    return rows
+
+
+def _write_tsv(dirname, name, header, lines):
+    path = os.path.join(dirname, name)
+    with open(path, "w") as f:
+        f.write("\t".join(header) + "\n")
+        for line in lines:
+            f.write("\t".join(line) + "\n")
+    return path
+
+
+class RowTextParityTest(unittest.TestCase):
+    """Row texts must match what existing collections were embedded from."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+
+    def assertMatchesBaseline(self, path, table_cfg):
+        docs = _load_table_rows_as_text(table_cfg)
+        self.assertEqual(
+            [(d["id"], d["text"]) for d in docs],
+            _baseline_rows(path, table_cfg),
+        )
+
+    def test_mixed_table_with_blanks(self):
+        rng = random.Random(0)
+        lines = []
+        for i in range(200):
+            lines.append([
+                f"P-{i:05d}",
+                "" if rng.random() < 0.2 else str(rng.randint(20, 90)),
+                "" if rng.random() < 0.2 else repr(rng.random() * 10 ** rng.randint(-3, 3)),
+                rng.choice(["Male", "Female", ""]),
+                str(rng.randint(0, 5)),
+            ])
+        path = _write_tsv(
+            self.dir, "mixed.tsv",
+            ["PATIENT_ID", "CURRENT_AGE_DEID", "SCORE", "GENDER", "N_LINES"],
+            lines,
+        )
+        self.assertMatchesBaseline(path, TableConfig("mixed", path, id_column="PATIENT_ID"))
+
+    def test_numeric_only_table_is_upcast(self):
+        lines = [[str(i), str(i * 7), "" if i % 3 else f"{i / 7!r}"] for i in range(1, 30)]
+        path = _write_tsv(self.dir, "numeric.tsv", ["patient_id", "COUNT", "VALUE"], lines)
+        self.assertMatchesBaseline(path, TableConfig("numeric", path))
+
+    def test_explicit_text_columns(self):
+        lines = [[f"P-{i}", str(i), f"{i * 0.1!r}", "x" if i % 2 else ""] for i in range(50)]
+        path = _write_tsv(self.dir, "cols.tsv", ["patient_id", "A", "B", "C"], lines)
+        self.assertMatchesBaseline(path, TableConfig("cols", path, text_columns=["B", "A"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+from unittest import mock
+
+import pandas as pd
+import pyarrow as pa
+
+from langgraph_rag.tools import cohort_query
+
+
+def _arrow_frame(**columns):
+    return pa.table(columns).to_pandas(types_mapper=pd.ArrowDtype)
+
+
+class FilterCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.df = _arrow_frame(
+            SEX=["Male", "Female", "female", None] * 50,
+            DX=[f"dx {i}" for i in range(200)],
+        )
+
+    def test_copies_reuse_the_cached_column(self):
+        cohort_query._apply_filter(self.df, {"SEX": "female"})
+        n_cached = len(cohort_query._LOWER_CACHE)
+
+        copy = self.df.copy(deep=True)
+        with mock.patch.object(
+            pd.Series, "astype", side_effect=AssertionError("recomputed")
+        ):
+            result = cohort_query._apply_filter(copy, {"SEX": "female"})
+
+        self.assertEqual(len(result), 100)
+        self.assertEqual(len(cohort_query._LOWER_CACHE), n_cached)
+
+    def test_modified_copy_is_not_served_stale_values(self):
+        cohort_query._apply_filter(self.df, {"SEX": ["male"]})
+
+        copy = self.df.copy(deep=True)
+        copy.loc[copy.index[:4], "SEX"] = "Unknown"
+
+        self.assertEqual(len(cohort_query._apply_filter(copy, {"SEX": ["male"]})), 49)
+        self.assertEqual(len(cohort_query._apply_filter(self.df, {"SEX": ["male"]})), 50)
+
+
+if __name__ == "__main__":
+    unittest.main()
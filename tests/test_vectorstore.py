@@ -0,0 +1,175 @@
+import asyncio
+import tempfile
+import types
+import unittest
+from unittest import mock
+
+import chromadb
+from chromadb.api.models.AsyncCollection import AsyncCollection
+
+from langgraph_rag import embeddings
+from langgraph_rag.chunking import DocChunk
+from langgraph_rag.config import IngestionConfig
+from langgraph_rag.ratelimit import AsyncRateLimiter
+from langgraph_rag.vectorstore import index_chunks, index_chunks_async
+
+
+class _FakeAsyncCollection(AsyncCollection):
+    """In-memory stand-in for a Chroma server collection."""
+
+    def __init__(self) -> None:  # skip AsyncCollection's client wiring
+        self.rows = {}
+
+    async def get(self, ids, include=None):
+        found = [i for i in ids if i in self.rows]
+        return {"ids": found, "documents": [self.rows[i][0] for i in found]}
+
+    async def add(self, ids, documents, metadatas, embeddings=None):
+        for i, doc, meta, emb in zip(ids, documents, metadatas, embeddings or [None] * len(ids)):
+            if i in self.rows:
+                raise ValueError(f"duplicate id {i}")
+            self.rows[i] = (doc, meta, emb)
+
+    async def upsert(self, ids, documents, metadatas, embeddings=None):
+        for i, doc, meta, emb in zip(ids, documents, metadatas, embeddings or [None] * len(ids)):
+            self.rows[i] = (doc, meta, emb)
+
+
+def _chunks(n):
+    return [DocChunk(id=str(i), text=f"text {i % 3}", metadata={"i": i}, n_tokens=3) for i in range(n)]
+
+
+class IndexChunksAsyncCollectionTest(unittest.TestCase):
+    def test_indexes_into_async_collection(self):
+        collection = _FakeAsyncCollection()
+        embedded = []
+
+        def embed(texts):
+            embedded.extend(texts)
+            return [[float(len(t)), 1.0] for t in texts]
+
+        asyncio.run(
+            index_chunks_async(
+                _chunks(10),
+                collection,
+                batch_size=4,
+                embedding_fn=embed,
+                rate_limiter=AsyncRateLimiter(10_000, 10_000_000),
+            )
+        )
+
+        self.assertEqual(len(collection.rows), 10)
+        self.assertEqual(collection.rows["4"][0], "text 1")
+        # In-batch duplicates are embedded once per batch.
+        self.assertLess(len(embedded), 10)
+
+    def test_skip_existing_on_async_collection(self):
+        collection = _FakeAsyncCollection()
+        embed = lambda texts: [[1.0, 2.0] for _ in texts]  # noqa: E731
+        limiter = AsyncRateLimiter(10_000, 10_000_000)
+
+        asyncio.run(index_chunks_async(_chunks(5), collection, embedding_fn=embed, rate_limiter=limiter))
+        asyncio.run(
+            index_chunks_async(
+                _chunks(8),
+                collection,
+                embedding_fn=embed,
+                rate_limiter=AsyncRateLimiter(10_000, 10_000_000),
+                skip_existing=True,
+            )
+        )
+
+        self.assertEqual(len(collection.rows), 8)
+
+    def test_skip_existing_replaces_changed_texts(self):
+        collection = _FakeAsyncCollection()
+        embedded = []
+
+        def embed(texts):
+            embedded.extend(texts)
+            return [[1.0, 2.0] for _ in texts]
+
+        limiter = AsyncRateLimiter(10_000, 10_000_000)
+        asyncio.run(index_chunks_async(_chunks(5), collection, embedding_fn=embed, rate_limiter=limiter))
+        embedded.clear()
+
+        edited = _chunks(5)
+        edited[2] = DocChunk(id="2", text="edited", metadata={"i": 2}, n_tokens=1)
+        with self.assertLogs("langgraph_rag.vectorstore", "WARNING"):
+            asyncio.run(
+                index_chunks_async(
+                    edited,
+                    collection,
+                    embedding_fn=embed,
+                    rate_limiter=AsyncRateLimiter(10_000, 10_000_000),
+                    skip_existing=True,
+                )
+            )
+
+        self.assertEqual(embedded, ["edited"])
+        self.assertEqual(collection.rows["2"][0], "edited")
+
+
+class IndexChunksSyncWrapperTest(unittest.TestCase):
+    def test_callable_from_running_event_loop(self):
+        # e.g. a Jupyter cell calling build_persistent_vector_store
+        collection = chromadb.EphemeralClient().get_or_create_collection(
+            "wrapper_test", embedding_function=None
+        )
+
+        async def notebook_cell():
+            index_chunks(_chunks(6), collection, embedding_fn=lambda texts: [[1.0, 2.0] for _ in texts])
+
+        asyncio.run(notebook_cell())
+        self.assertEqual(collection.count(), 6)
+
+
+class _RecordingLimiter:
+    def __init__(self):
+        self.calls = []
+
+    async def acquire(self, n_requests=1, n_tokens=0):
+        self.calls.append((n_requests, n_tokens))
+
+
+class _FakeEmbeddingsClient:
+    def __init__(self):
+        self.requests = 0
+        self.embeddings = self
+
+    def create(self, model, input, **kwargs):
+        self.requests += 1
+        return types.SimpleNamespace(
+            data=[types.SimpleNamespace(index=i, embedding=[float(len(t)), 1.0]) for i, t in enumerate(input)]
+        )
+
+
+class RateLimitChargesOnlyApiTrafficTest(unittest.TestCase):
+    def test_warm_rerun_is_not_throttled(self):
+        client = _FakeEmbeddingsClient()
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch.object(embeddings, "_get_client", lambda: client), \
+                mock.patch.object(
+                    embeddings, "get_token_encoder", side_effect=AssertionError("re-tokenized")
+                ):
+            embed = embeddings.get_text_embedder(
+                IngestionConfig(tables=[], metadata_text_path="", persist_dir=tmp)
+            )
+
+            cold = _RecordingLimiter()
+            asyncio.run(
+                index_chunks_async(_chunks(6), _FakeAsyncCollection(), embedding_fn=embed, rate_limiter=cold)
+            )
+            # Three distinct texts, charged the chunker's 3 tokens each, in one request.
+            self.assertEqual(cold.calls, [(1, 9)])
+
+            warm = _RecordingLimiter()
+            asyncio.run(
+                index_chunks_async(_chunks(6), _FakeAsyncCollection(), embedding_fn=embed, rate_limiter=warm)
+            )
+            self.assertEqual(warm.calls, [])
+            self.assertEqual(client.requests, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()